@@ -0,0 +1,142 @@
+# benchmarks/__init__.py - timing benchmarks for the FBS models and figures
+#
+# This package times the pieces of the FBS examples that are most likely to
+# be optimized: the right-hand side (update) functions of the shared models,
+# simulations of those models using ct.input_output_response, and complete
+# figure scripts.  The results can be saved as a JSON baseline and later runs
+# compared against the baseline to flag regressions.
+#
+# Usage: python -m benchmarks [--group GROUP] [--save FILE] [--compare FILE]
+#
+# Benchmarks are registered with the `benchmark` decorator in the modules
+# rhs.py (single RHS evaluations), sims.py (simulations) and scripts.py
+# (end-to-end figure scripts).
+
+import json
+import os
+import platform
+import statistics
+import timeit
+
+# Registry of benchmarks: {group: {name: setup_function}}
+registry = {}
+
+# Default location of the saved baseline
+default_baseline = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+
+def benchmark(group, name=None, repeat=5):
+    """Register a benchmark.
+
+    The decorated function is called once to set up the benchmark and must
+    return a function of no arguments that runs the code being timed.
+
+    Parameters
+    ----------
+    group : str
+        Benchmark group ('rhs', 'sims' or 'scripts').
+    name : str, optional
+        Name of the benchmark (defaults to the name of the function).
+    repeat : int, optional
+        Number of timing repetitions.
+
+    """
+    def decorator(setup):
+        registry.setdefault(group, {})[name or setup.__name__] = \
+            (setup, repeat)
+        return setup
+    return decorator
+
+
+def time_function(func, repeat=5):
+    """Time a function, returning the best and median time per call [s]."""
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    times = [t / number for t in timer.repeat(repeat=repeat, number=number)]
+    return {
+        'best': min(times), 'median': statistics.median(times),
+        'number': number, 'repeat': repeat}
+
+
+def load_groups(groups=None):
+    # Importing the modules registers the benchmarks
+    from . import rhs, sims, scripts
+    return sorted(registry) if groups is None else groups
+
+
+def run(groups=None, pattern=None, verbose=True):
+    """Run the registered benchmarks.
+
+    Parameters
+    ----------
+    groups : list of str, optional
+        Groups of benchmarks to run (default: all groups).
+    pattern : str, optional
+        Only run benchmarks whose name contains this string.
+    verbose : bool, optional
+        Print the results as the benchmarks are run.
+
+    Returns
+    -------
+    dict
+        Results indexed by 'group.name'; see `time_function`.
+
+    """
+    results = {}
+    for group in load_groups(groups):
+        for name, (setup, repeat) in registry[group].items():
+            if pattern is not None and pattern not in name:
+                continue
+            result = results[f'{group}.{name}'] = \
+                time_function(setup(), repeat)
+            if verbose:
+                print("%-40s %12.3e s  (median %.3e s)" % (
+                    f'{group}.{name}', result['best'], result['median']),
+                      flush=True)
+    return results
+
+
+def save(results, filename=default_baseline):
+    """Save benchmark results as a JSON baseline."""
+    from importlib import metadata
+    info = {'python': platform.python_version(), 'machine': platform.node()}
+    for package in ['control', 'numpy', 'scipy', 'matplotlib']:
+        info[package] = metadata.version(package)
+    with open(filename, 'w') as file:
+        json.dump({'info': info, 'results': results}, file, indent=2)
+
+
+def compare(results, filename=default_baseline, threshold=1.25,
+            verbose=True):
+    """Compare benchmark results against a saved baseline.
+
+    Parameters
+    ----------
+    results : dict
+        Results from `run`.
+    filename : str, optional
+        JSON baseline written by `save`.
+    threshold : float, optional
+        A benchmark is flagged as a regression if its best time is more than
+        `threshold` times the baseline best time.
+
+    Returns
+    -------
+    list of str
+        Names of the benchmarks that regressed.
+
+    """
+    with open(filename) as file:
+        baseline = json.load(file)['results']
+
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        ratio = result['best'] / baseline[name]['best']
+        if ratio > threshold:
+            regressions.append(name)
+        if verbose:
+            print("%-40s %6.2fx%s" % (
+                name, ratio, '  REGRESSION' if ratio > threshold else ''))
+    return regressions
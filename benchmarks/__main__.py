@@ -0,0 +1,36 @@
+# benchmarks/__main__.py - command line interface for the benchmarks
+
+import argparse
+import sys
+
+from . import compare, default_baseline, run, save
+
+parser = argparse.ArgumentParser(
+    prog='python -m benchmarks',
+    description="Time the FBS model RHS functions, simulations and scripts.")
+parser.add_argument(
+    '-g', '--group', action='append', choices=['rhs', 'sims', 'scripts'],
+    help="benchmark group to run (default: all); can be repeated")
+parser.add_argument(
+    '-k', dest='pattern', help="only run benchmarks containing this string")
+parser.add_argument(
+    '--save', nargs='?', const=default_baseline, metavar='FILE',
+    help="save the results as a baseline (default: %(const)s)")
+parser.add_argument(
+    '--compare', nargs='?', const=default_baseline, metavar='FILE',
+    help="compare against a saved baseline (default: %(const)s)")
+parser.add_argument(
+    '--threshold', type=float, default=1.25,
+    help="slowdown ratio flagged as a regression (default: %(default)s)")
+args = parser.parse_args()
+
+results = run(args.group, args.pattern)
+if args.save:
+    save(results, args.save)
+
+if args.compare:
+    regressions = compare(results, args.compare, args.threshold)
+    if regressions:
+        print("These benchmarks regressed:")
+        print(" " + " ".join(regressions))
+        sys.exit(1)
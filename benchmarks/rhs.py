@@ -0,0 +1,66 @@
+# benchmarks/rhs.py - single evaluations of the model update functions
+
+import numpy as np
+
+from . import benchmark
+
+
+@benchmark('rhs')
+def vehicle_update():
+    import cruise
+    x, u = np.array([20.]), np.array([0.3, 4, 0.05])
+    return lambda: cruise.vehicle_update(0, x, u, {})
+
+
+@benchmark('rhs')
+def vehicle_update_bound():
+    import cruise
+    x, u = np.array([20.]), np.array([0.3, 4, 0.05])
+    update = cruise.create_vehicle_update({})
+    return lambda: update(0, x, u)
+
+
+@benchmark('rhs')
+def predprey_update():
+    import predprey
+    x, u = np.array([25., 20.]), np.array([0.])
+    params = predprey.predprey_params
+    return lambda: predprey.predprey_update(0, x, u, params)
+
+
+@benchmark('rhs')
+def congctrl_update():
+    import congctrl
+    M = 6
+    x = np.append(np.ones(M) * 4.5, 400.)
+    params = {'N': 60, 'rho': 2e-4, 'c': 10}
+    return lambda: congctrl._congctrl_update(0, x, None, params)
+
+
+@benchmark('rhs')
+def steering_update():
+    import steering
+    x, u = np.array([0., 1., 0.1]), np.array([10., 0.05])
+    params = steering.steering.params
+    return lambda: steering.steering_update(0, x, u, params)
+
+
+@benchmark('rhs')
+def whipple_A():
+    import bicycle
+    return lambda: bicycle.whipple_A(5.)
+
+
+@benchmark('rhs')
+def whipple_eigvals_sweep():
+    # Eigenvalue sweep used in example 5.17
+    import bicycle
+    v0 = np.linspace(-15, 15, 500)
+    return lambda: bicycle.whipple_eigvals(v0)
+
+
+@benchmark('rhs')
+def whipple_critical_speeds():
+    # Weave and capsize speeds used in example 5.17
+    import bicycle
+    return bicycle.whipple_critical_speeds
@@ -0,0 +1,40 @@
+# benchmarks/scripts.py - end-to-end timing of figure scripts
+#
+# Each benchmark runs a complete figure script in a separate process (using
+# run_examples.run_script), in a scratch directory so that the figures in
+# the example directory are not changed.
+
+import os
+import tempfile
+
+from . import benchmark
+
+# Scripts that exercise the shared models
+benchmark_scripts = [
+    'figure-1.11-cruise_robustness.py',
+    'figure-6.14-cruise_linearized.py',
+    'figure-4.13-congctrl_tcpsim.py',
+    'figure-7.7-predprey_place.py',
+    'example-5.17-bicycle_stability.py',
+    'example-8.10-steering_gainsched.py',
+]
+
+
+def _script_benchmark(script):
+    def setup():
+        from run_examples import example_dir, run_script
+        path = os.path.join(example_dir, script)
+
+        def run():
+            with tempfile.TemporaryDirectory() as workdir:
+                result = run_script(path, cwd=workdir)
+            if result['status'] != 0:
+                raise RuntimeError(
+                    f"{script} failed:\n" + result['output'])
+        return run
+    return setup
+
+
+for _script in benchmark_scripts:
+    benchmark('scripts', os.path.splitext(_script)[0], repeat=1)(
+        _script_benchmark(_script))
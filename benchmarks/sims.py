@@ -0,0 +1,62 @@
+# benchmarks/sims.py - simulations of the shared models
+#
+# Each benchmark runs ct.input_output_response over the same horizon and
+# with the same inputs as the figure that uses the model.
+
+import numpy as np
+import control as ct
+
+from . import benchmark
+
+
+@benchmark('sims', repeat=3)
+def cruise_PI_hill():
+    # Response of the closed loop system to a hill (figure 1.11)
+    import cruise
+    T = np.linspace(0, 25, 101)
+    theta_hill = np.clip(4./180. * np.pi * (T - 5), 0, 4./180. * np.pi)
+    U = [20 * np.ones(T.shape), 4 * np.ones(T.shape), theta_hill]
+    X0, _ = ct.find_eqpt(
+        cruise.cruise_PI, [20, 0], [20, 4, 0], iu=[1, 2], y0=[20, 0], iy=[0])
+    return lambda: ct.input_output_response(cruise.cruise_PI, T, U, X0)
+
+
+@benchmark('sims', repeat=3)
+def cruise_PI_ensemble():
+    # Hill response for 300 vehicle masses, simulated together
+    import cruise
+    T = np.linspace(0, 25, 101)
+    theta_hill = np.clip(4./180. * np.pi * (T - 5), 0, 4./180. * np.pi)
+    U = [20 * np.ones(T.shape), 4 * np.ones(T.shape), theta_hill]
+    params = {'m': np.linspace(1200, 2000, 300)}
+    return lambda: cruise.cruise_PI_ensemble(T, U, params)
+
+
+@benchmark('sims', repeat=3)
+def predprey_ctstime():
+    # Continuous time predator-prey simulation (figure 4.20)
+    import predprey
+    timepts = np.linspace(0, 70, 500)
+    return lambda: ct.input_output_response(
+        predprey.predprey, timepts, 0, [25, 20])
+
+
+@benchmark('sims', repeat=3)
+def congctrl_tcpsim():
+    # Congestion control simulation from a perturbed equilibrium (figure 4.13)
+    import congctrl
+    M, N = 6, 60
+    sys = congctrl.create_iosystem(M, N=N)
+    xeq, _ = ct.find_eqpt(sys, np.ones(M+1), 0)
+    X0 = np.append(xeq[:-1] * np.linspace(0.5, 1.5, M), xeq[-1] / 2)
+    tvec = np.linspace(0, 500, 100)
+    return lambda: ct.input_output_response(sys, tvec, U=0, X0=X0)
+
+
+@benchmark('sims', repeat=3)
+def steering_lanechange():
+    # Open loop steering maneuver with saturation
+    import steering
+    T = np.linspace(0, 10, 200)
+    U = [10 * np.ones(T.shape), 0.2 * np.sin(T)]
+    return lambda: ct.input_output_response(steering.steering, T, U, 0)
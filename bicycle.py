@@ -67,103 +67,542 @@ mfw = 1.5
 Jxxfw = 0.07
 Jyyfw = 0.14
 
-# Auxiliary variables
-xrw = 0
-zrw = Rrw
-xfw = b
-zfw = Rfw
-Jzzrw = Jxxrw
-Jzzfw = Jxxfw
-
-# Total mass
-mt = mrf + mrw + mff + mfw
-
-# Center of mass
-xt = (mrf * xrf + mrw * xrw + mff * xff + mfw * xfw) / mt
-zt = (mrf * zrf + mrw * zrw + mff * zff + mfw * zfw) / mt
-
-# Inertia tensor components
-Jxxt = (
-    Jxxrf + mrf * zrf**2 +
-    Jxxrw + mrw * zrw**2 +
-    Jxxff + mff * zff**2 +
-    Jxxfw + mfw * zfw**2
-)
-Jxzt = (
-    Jxzrf + mrf * xrf * zrf +
-    mrw * xrw * zrw +
-    Jxzff + mff * xff * zff +
-    mfw * xfw * zfw
-)
-Jzzt = (
-    Jzzrf + mrf * xrf**2 +
-    Jzzrw + mrw * xrw**2 +
-    Jzzff + mff * xff**2 +
-    Jzzfw + mfw * xfw**2
-)
-
-# Front frame parameters
-mf = mff + mfw
-xf = (mff * xff + mfw * xfw) / mf
-zf = (mff * zff + mfw * zfw) / mf
-
-Jxxf = (
-    Jxxff + mff * (zff - zf)**2 +
-    Jxxfw + mfw * (zfw - zf)**2
-)
-Jxzf = (
-    Jxzff + mff * (xff - xf) * (zff - zf) +
-    mfw * (xfw - xf) * (zfw - zf)
-)
-Jzzf = (
-    Jzzff + mff * (xff - xf)**2 +
-    Jzzfw + mfw * (xfw - xf)**2
-)
-
-# Auxiliary variables
-d = (xf - b - c) * np.sin(lambda_angle) + zf * np.cos(lambda_angle)
-Fll = (
-    mf * d**2 +
-    Jxxf * np.cos(lambda_angle)**2 +
-    2 * Jxzf * np.sin(lambda_angle) * np.cos(lambda_angle) +
-    Jzzf * np.sin(lambda_angle)**2
-)
-Flx = mf * d * zf + Jxxf * np.cos(lambda_angle) + Jxzf * np.sin(lambda_angle)
-Flz = mf * d * xf + Jxzf * np.cos(lambda_angle) + Jzzf * np.sin(lambda_angle)
-gamma = c * np.sin(lambda_angle) / b
-Sr = Jyyrw / Rrw
-Sf = Jyyfw / Rfw
-St = Sr + Sf
-Su = mf * d + gamma * mt * xt
-
-# Matrices for the linearized fourth-order model
-M = np.array([
-    [Jxxt, -Flx - gamma * Jxzt],
-    [-Flx - gamma * Jxzt, Fll + 2 * gamma * Flz + gamma**2 * Jzzt]
-])
-
-K0 = np.array([
-    [-mt * g * zt, g * Su],
-    [g * Su, -g * Su * np.cos(lambda_angle)]
-])
-
-K2 = np.array([
-    [0, -(St + mt * zt) * np.sin(lambda_angle) / b],
-    [0, (Su + Sf * np.cos(lambda_angle)) * np.sin(lambda_angle) / b]
-])
-
-c12 = gamma * St + Sf * np.sin(lambda_angle) \
-    + Jxzt * np.sin(lambda_angle) / b + gamma * mt * zt
-c22 = Flz * np.sin(lambda_angle) / b \
-    + gamma * (Su + Jzzt * np.sin(lambda_angle) / b)
-
-C = np.array([
-    [0, -c12],
-    [gamma * St + Sf * np.sin(lambda_angle), c22]
-])
-
-def whipple_A(v0):
-    return np.block([
-        [np.zeros((2, 2)), np.eye(2)],
-        [-np.linalg.inv(M) @ (K0 + K2 * v0**2), -np.linalg.inv(M) @ C * v0]
-    ])
+# Default values of the parameters
+default_params = {
+    'g': g, 'b': b, 'c': c, 'Rrw': Rrw, 'Rfw': Rfw,
+    'lambda_angle': lambda_angle,
+    'mrf': mrf, 'xrf': xrf, 'zrf': zrf, 'Jxxrf': Jxxrf, 'Jxzrf': Jxzrf,
+    'Jyyrf': Jyyrf, 'Jzzrf': Jzzrf,
+    'mff': mff, 'xff': xff, 'zff': zff, 'Jxxff': Jxxff, 'Jxzff': Jxzff,
+    'Jyyff': Jyyff, 'Jzzff': Jzzff,
+    'mrw': mrw, 'Jxxrw': Jxxrw, 'Jyyrw': Jyyrw,
+    'mfw': mfw, 'Jxxfw': Jxxfw, 'Jyyfw': Jyyfw,
+}
+
+
+class BicycleParams:
+    """Physical parameters for the bicycle model.
+
+    The 26 parameters are given as keyword arguments, with the values above
+    used for any parameters that are not given (see `default_params`).  Any
+    of the parameters can be an array, in which case `whipple_matrices`
+    returns stacks of matrices with the broadcast shape of the parameters.
+
+    Example
+    -------
+    >>> params = BicycleParams(c=np.linspace(0.02, 0.12, 11))
+    >>> M, C, K0, K2 = whipple_matrices(params)     # M.shape == (11, 2, 2)
+
+    """
+    def __init__(self, **params):
+        unknown = set(params) - set(default_params)
+        if unknown:
+            raise TypeError(
+                "unknown bicycle parameters: " + ", ".join(sorted(unknown)))
+        for name, value in default_params.items():
+            setattr(self, name, params.get(name, value))
+
+    def __repr__(self):
+        changed = [
+            f"{name}={value!r}" for name, value in self.as_dict().items()
+            if value is not default_params[name]]
+        return "BicycleParams(" + ", ".join(changed) + ")"
+
+    @property
+    def shape(self):
+        """Broadcast shape of the parameter values."""
+        return np.broadcast_shapes(*map(np.shape, self.as_dict().values()))
+
+    def as_dict(self):
+        """Return the parameters as a dictionary."""
+        return {name: getattr(self, name) for name in default_params}
+
+    def replace(self, **params):
+        """Return a copy with some of the parameters changed."""
+        return BicycleParams(**{**self.as_dict(), **params})
+
+
+# Stack the entries of 2x2 matrices (broadcasting them to a common shape)
+def _matrix(a11, a12, a21, a22):
+    a11, a12, a21, a22 = np.broadcast_arrays(
+        *map(np.asarray, (a11, a12, a21, a22)))
+    return np.stack([np.stack([a11, a12], axis=-1),
+                     np.stack([a21, a22], axis=-1)], axis=-2).astype(float)
+
+
+# Names of the quantities computed by derived_quantities()
+derived_names = [
+    'xrw', 'zrw', 'xfw', 'zfw', 'Jzzrw', 'Jzzfw', 'mt', 'xt', 'zt',
+    'Jxxt', 'Jxzt', 'Jzzt', 'mf', 'xf', 'zf', 'Jxxf', 'Jxzf', 'Jzzf',
+    'd', 'Fll', 'Flx', 'Flz', 'gamma', 'Sr', 'Sf', 'St', 'Su',
+    'c12', 'c22']
+
+
+def derived_quantities(params=None):
+    """Quantities derived from the bicycle parameters.
+
+    These are the total mass, center of mass and inertia of the bicycle,
+    the corresponding quantities for the front frame, and the auxiliary
+    variables used in the matrices of the linearized model (see
+    `derived_names`).
+
+    Parameters
+    ----------
+    params : BicycleParams or dict, optional
+        Bicycle parameters (default: the module values).
+
+    Returns
+    -------
+    dict
+        Values of the derived quantities, with shape params.shape.
+
+    """
+    if params is None:
+        params = BicycleParams()
+    elif isinstance(params, dict):
+        params = BicycleParams(**params)
+    p = params
+
+    # Parameters
+    g, b, c, Rrw, Rfw, lambda_angle = \
+        p.g, p.b, p.c, p.Rrw, p.Rfw, p.lambda_angle
+    mrf, xrf, zrf, Jxxrf, Jxzrf, Jzzrf = \
+        p.mrf, p.xrf, p.zrf, p.Jxxrf, p.Jxzrf, p.Jzzrf
+    mff, xff, zff, Jxxff, Jxzff, Jzzff = \
+        p.mff, p.xff, p.zff, p.Jxxff, p.Jxzff, p.Jzzff
+    mrw, Jxxrw, Jyyrw = p.mrw, p.Jxxrw, p.Jyyrw
+    mfw, Jxxfw, Jyyfw = p.mfw, p.Jxxfw, p.Jyyfw
+
+    # Auxiliary variables
+    xrw = 0
+    zrw = Rrw
+    xfw = b
+    zfw = Rfw
+    Jzzrw = Jxxrw
+    Jzzfw = Jxxfw
+
+    # Total mass
+    mt = mrf + mrw + mff + mfw
+
+    # Center of mass
+    xt = (mrf * xrf + mrw * xrw + mff * xff + mfw * xfw) / mt
+    zt = (mrf * zrf + mrw * zrw + mff * zff + mfw * zfw) / mt
+
+    # Inertia tensor components
+    Jxxt = (
+        Jxxrf + mrf * zrf**2 +
+        Jxxrw + mrw * zrw**2 +
+        Jxxff + mff * zff**2 +
+        Jxxfw + mfw * zfw**2
+    )
+    Jxzt = (
+        Jxzrf + mrf * xrf * zrf +
+        mrw * xrw * zrw +
+        Jxzff + mff * xff * zff +
+        mfw * xfw * zfw
+    )
+    Jzzt = (
+        Jzzrf + mrf * xrf**2 +
+        Jzzrw + mrw * xrw**2 +
+        Jzzff + mff * xff**2 +
+        Jzzfw + mfw * xfw**2
+    )
+
+    # Front frame parameters
+    mf = mff + mfw
+    xf = (mff * xff + mfw * xfw) / mf
+    zf = (mff * zff + mfw * zfw) / mf
+
+    Jxxf = (
+        Jxxff + mff * (zff - zf)**2 +
+        Jxxfw + mfw * (zfw - zf)**2
+    )
+    Jxzf = (
+        Jxzff + mff * (xff - xf) * (zff - zf) +
+        mfw * (xfw - xf) * (zfw - zf)
+    )
+    Jzzf = (
+        Jzzff + mff * (xff - xf)**2 +
+        Jzzfw + mfw * (xfw - xf)**2
+    )
+
+    # Auxiliary variables
+    d = (xf - b - c) * np.sin(lambda_angle) + zf * np.cos(lambda_angle)
+    Fll = (
+        mf * d**2 +
+        Jxxf * np.cos(lambda_angle)**2 +
+        2 * Jxzf * np.sin(lambda_angle) * np.cos(lambda_angle) +
+        Jzzf * np.sin(lambda_angle)**2
+    )
+    Flx = mf * d * zf + Jxxf * np.cos(lambda_angle) \
+        + Jxzf * np.sin(lambda_angle)
+    Flz = mf * d * xf + Jxzf * np.cos(lambda_angle) \
+        + Jzzf * np.sin(lambda_angle)
+    gamma = c * np.sin(lambda_angle) / b
+    Sr = Jyyrw / Rrw
+    Sf = Jyyfw / Rfw
+    St = Sr + Sf
+    Su = mf * d + gamma * mt * xt
+
+    c12 = gamma * St + Sf * np.sin(lambda_angle) \
+        + Jxzt * np.sin(lambda_angle) / b + gamma * mt * zt
+    c22 = Flz * np.sin(lambda_angle) / b \
+        + gamma * (Su + Jzzt * np.sin(lambda_angle) / b)
+
+    return {
+        'xrw': xrw, 'zrw': zrw, 'xfw': xfw, 'zfw': zfw, 'Jzzrw': Jzzrw,
+        'Jzzfw': Jzzfw, 'mt': mt, 'xt': xt, 'zt': zt, 'Jxxt': Jxxt,
+        'Jxzt': Jxzt, 'Jzzt': Jzzt, 'mf': mf, 'xf': xf, 'zf': zf,
+        'Jxxf': Jxxf, 'Jxzf': Jxzf, 'Jzzf': Jzzf, 'd': d, 'Fll': Fll,
+        'Flx': Flx, 'Flz': Flz, 'gamma': gamma, 'Sr': Sr, 'Sf': Sf, 'St': St,
+        'Su': Su, 'c12': c12, 'c22': c22}
+
+
+def whipple_matrices(params=None):
+    """Matrices for the linearized bicycle model.
+
+    The model is M q'' + C v0 q' + (K0 + K2 v0^2) q = 0, where q = [phi,
+    delta] are the roll and steer angles (Schwab et al, 2004).
+
+    Parameters
+    ----------
+    params : BicycleParams or dict, optional
+        Bicycle parameters (default: the module values).
+
+    Returns
+    -------
+    M, C, K0, K2 : array
+        Matrices for the model, with shape params.shape + (2, 2).
+
+    """
+    if params is None:
+        params = BicycleParams()
+    elif isinstance(params, dict):
+        params = BicycleParams(**params)
+    g, b, lambda_angle = params.g, params.b, params.lambda_angle
+
+    q = derived_quantities(params)
+    mt, zt = q['mt'], q['zt']
+    Jxxt, Jxzt, Jzzt = q['Jxxt'], q['Jxzt'], q['Jzzt']
+    Fll, Flx, Flz, gamma = q['Fll'], q['Flx'], q['Flz'], q['gamma']
+    Sf, St, Su, c12, c22 = q['Sf'], q['St'], q['Su'], q['c12'], q['c22']
+
+    # Matrices for the linearized fourth-order model
+    M = _matrix(
+        Jxxt, -Flx - gamma * Jxzt,
+        -Flx - gamma * Jxzt, Fll + 2 * gamma * Flz + gamma**2 * Jzzt)
+
+    K0 = _matrix(
+        -mt * g * zt, g * Su,
+        g * Su, -g * Su * np.cos(lambda_angle))
+
+    K2 = _matrix(
+        0, -(St + mt * zt) * np.sin(lambda_angle) / b,
+        0, (Su + Sf * np.cos(lambda_angle)) * np.sin(lambda_angle) / b)
+
+    C = _matrix(
+        0, -c12,
+        gamma * St + Sf * np.sin(lambda_angle), c22)
+
+    return M, C, K0, K2
+
+
+# Derived quantities and matrices for the module parameters
+_derived = derived_quantities()
+(xrw, zrw, xfw, zfw, Jzzrw, Jzzfw, mt, xt, zt,
+ Jxxt, Jxzt, Jzzt, mf, xf, zf, Jxxf, Jxzf, Jzzf,
+ d, Fll, Flx, Flz, gamma, Sr, Sf, St, Su,
+ c12, c22) = (_derived[name] for name in derived_names)
+
+M, C, K0, K2 = whipple_matrices()
+
+# Matrices for the first order model, computed once
+Minv = np.linalg.inv(M)
+MinvK0 = Minv @ K0
+MinvK2 = Minv @ K2
+MinvC = Minv @ C
+
+
+# Matrices for the first order model for a given set of parameters
+def _first_order(params):
+    if params is None:
+        return MinvK0, MinvK2, MinvC
+    M, C, K0, K2 = whipple_matrices(params)
+    Minv = np.linalg.inv(M)
+    return Minv @ K0, Minv @ K2, Minv @ C
+
+
+# Dynamics matrix given the first order matrices
+def _whipple_A(v0, MinvK0, MinvK2, MinvC):
+    v0 = np.asarray(v0, dtype=float)[..., np.newaxis, np.newaxis]
+    A = np.zeros(np.broadcast_shapes(v0.shape, MinvK0.shape)[:-2] + (4, 4))
+    A[..., 0:2, 2:4] = np.eye(2)
+    A[..., 2:4, 0:2] = -(MinvK0 + MinvK2 * v0**2)
+    A[..., 2:4, 2:4] = -MinvC * v0
+    return A
+
+
+def whipple_A(v0, params=None):
+    """Dynamics matrix for the Whipple bicycle model.
+
+    Parameters
+    ----------
+    v0 : float or array
+        Forward velocity of the bicycle [m/s].
+    params : BicycleParams or dict, optional
+        Bicycle parameters (default: the module values).
+
+    Returns
+    -------
+    A : array
+        Dynamics matrix for states [phi, delta, phidot, deltadot].  If `v0`
+        or the parameters are arrays, the matrices are stacked, giving an
+        array of shape broadcast(v0.shape, params.shape) + (4, 4).
+
+    """
+    return _whipple_A(v0, *_first_order(params))
+
+
+def whipple_eigvals(v0, sort=True, params=None):
+    """Eigenvalues of the Whipple bicycle model.
+
+    Parameters
+    ----------
+    v0 : float or array
+        Forward velocity of the bicycle [m/s].
+    sort : bool, optional
+        If True (default), sort the eigenvalues for each velocity (using
+        np.sort, which orders by real part and then imaginary part).
+    params : BicycleParams or dict, optional
+        Bicycle parameters (default: the module values).
+
+    Returns
+    -------
+    array
+        Eigenvalues, with shape v0.shape + (4,), computed in a single
+        batched call to np.linalg.eigvals.
+
+    """
+    eigvals = np.linalg.eigvals(whipple_A(v0, params)).astype(complex)
+    return np.sort(eigvals, axis=-1) if sort else eigvals
+
+
+#
+# Characteristic polynomial
+#
+# The characteristic polynomial of the bicycle model is
+#
+#   det(M s^2 + C v0 s + K0 + K2 v0^2) = a4 s^4 + a3 s^3 + ... + a0,
+#
+# where each coefficient a_k is a polynomial in v0 of degree at most four.
+# Stability can then be determined from the Routh-Hurwitz conditions for a
+# quartic, without computing the eigenvalues.  The functions below work
+# with stacks of matrices (e.g., for different bicycle parameters), so
+# that stability can be evaluated over large grids of velocities and
+# parameters using NumPy operations.
+#
+
+# Coefficients of det(X + Y) - det(X) - det(Y) for 2x2 matrices
+def _cross(X, Y):
+    return X[..., 0, 0] * Y[..., 1, 1] + Y[..., 0, 0] * X[..., 1, 1] - \
+        X[..., 0, 1] * Y[..., 1, 0] - Y[..., 0, 1] * X[..., 1, 0]
+
+
+def _det(X):
+    return X[..., 0, 0] * X[..., 1, 1] - X[..., 0, 1] * X[..., 1, 0]
+
+
+def charpoly_coefficients(M=M, C=C, K0=K0, K2=K2):
+    """Coefficients of the characteristic polynomial as polynomials in v0.
+
+    Parameters
+    ----------
+    M, C, K0, K2 : array, optional
+        Matrices for the bicycle model (default: the module values).  Stacks
+        of matrices with shape (..., 2, 2) can be given.
+
+    Returns
+    -------
+    array
+        Array P with shape (..., 5, 5), where P[..., k, j] is the
+        coefficient of s^(4-k) v0^j in det(M s^2 + C v0 s + K0 + K2 v0^2).
+
+    """
+    M, C, K0, K2 = np.broadcast_arrays(*map(np.asarray, (M, C, K0, K2)))
+    zero = np.zeros(M.shape[:-2])
+    return np.stack([
+        np.stack([_det(M), zero, zero, zero, zero], axis=-1),
+        np.stack([zero, _cross(M, C), zero, zero, zero], axis=-1),
+        np.stack([_cross(M, K0), zero, _cross(M, K2) + _det(C), zero, zero],
+                 axis=-1),
+        np.stack([zero, _cross(C, K0), zero, _cross(C, K2), zero], axis=-1),
+        np.stack([_det(K0), zero, _cross(K0, K2), zero, _det(K2)], axis=-1),
+    ], axis=-2)
+
+
+def whipple_charpoly(v0, coeffs=None):
+    """Characteristic polynomial of the bicycle model at given velocities.
+
+    Parameters
+    ----------
+    v0 : float or array
+        Forward velocity of the bicycle [m/s].
+    coeffs : array, optional
+        Coefficient polynomials from `charpoly_coefficients` (default: the
+        module parameters).  The leading dimensions of `coeffs` broadcast
+        against the shape of `v0`.
+
+    Returns
+    -------
+    array
+        Coefficients [a4, a3, a2, a1, a0] of the characteristic polynomial
+        (highest power first), with shape (..., 5).
+
+    """
+    coeffs = _charpoly if coeffs is None else coeffs
+    v0 = np.asarray(v0, dtype=float)[..., np.newaxis]
+
+    # Evaluate the polynomials in v0 using Horner's method
+    result = coeffs[..., 4]
+    for j in range(3, -1, -1):
+        result = result * v0 + coeffs[..., j]
+    return result
+
+
+def whipple_stable(v0, coeffs=None):
+    """Check stability of the bicycle model using Routh-Hurwitz.
+
+    A quartic a4 s^4 + a3 s^3 + a2 s^2 + a1 s + a0 (with a4 > 0) has all of
+    its roots in the open left half plane if and only if all of the
+    coefficients are positive, a3 a2 - a4 a1 > 0 and (a3 a2 - a4 a1) a1 -
+    a3^2 a0 > 0.
+
+    Parameters
+    ----------
+    v0 : float or array
+        Forward velocity of the bicycle [m/s].
+    coeffs : array, optional
+        Coefficient polynomials from `charpoly_coefficients`.
+
+    Returns
+    -------
+    bool or array
+        True where the model is asymptotically stable.
+
+    """
+    a = whipple_charpoly(v0, coeffs)
+    a = a * np.sign(a[..., :1])         # make the leading coefficient positive
+    a4, a3, a2, a1, a0 = np.moveaxis(a, -1, 0)
+    h3 = a3 * a2 - a4 * a1
+    return np.all(a > 0, axis=-1) & (h3 > 0) & (h3 * a1 - a3**2 * a0 > 0)
+
+
+def whipple_roots(v0, coeffs=None, sort=True):
+    """Eigenvalues of the bicycle model from the characteristic polynomial.
+
+    The roots are computed as the eigenvalues of a stack of companion
+    matrices (as in np.roots, but for all velocities at once).
+
+    Parameters
+    ----------
+    v0 : float or array
+        Forward velocity of the bicycle [m/s].
+    coeffs : array, optional
+        Coefficient polynomials from `charpoly_coefficients`.
+    sort : bool, optional
+        If True (default), sort the roots as in `whipple_eigvals`.
+
+    Returns
+    -------
+    array
+        Roots of the characteristic polynomial, with shape (..., 4).
+
+    """
+    a = whipple_charpoly(v0, coeffs)
+    companion = np.zeros(a.shape[:-1] + (4, 4))
+    companion[..., 0, :] = -a[..., 1:] / a[..., :1]
+    companion[..., 1:, :-1] = np.eye(3)
+    roots = np.linalg.eigvals(companion).astype(complex)
+    return np.sort(roots, axis=-1) if sort else roots
+
+
+# Characteristic polynomial coefficients for the module parameters
+_charpoly = charpoly_coefficients()
+
+
+#
+# Stability limits
+#
+# The bicycle is stable in a window of velocities between the weave speed
+# (where a complex pair of eigenvalues crosses into the left half plane)
+# and the capsize speed (where a real eigenvalue crosses into the right half
+# plane).  These speeds are found by bracketing the changes in stability on
+# a grid using the Routh-Hurwitz conditions (which require no eigenvalue
+# computations) and then refining each bracket by root finding on the
+# largest real part of the eigenvalues.
+#
+
+def spectral_abscissa(v0, params=None):
+    """Largest real part of the eigenvalues of the bicycle model."""
+    return np.max(whipple_eigvals(v0, False, params).real, axis=-1)
+
+
+def whipple_critical_speeds(vmax=20., num=201, params=None):
+    """Weave and capsize speeds for the bicycle model.
+
+    Parameters
+    ----------
+    vmax : float, optional
+        Largest velocity to consider [m/s].
+    num : int, optional
+        Number of points in the grid used to bracket the changes in
+        stability.
+    params : BicycleParams or dict, optional
+        Bicycle parameters (default: the module values).  If the parameters
+        are arrays, the speeds are computed for each set of parameters.
+
+    Returns
+    -------
+    v_weave, v_capsize : float or array
+        Velocities at which the bicycle becomes stable and unstable,
+        computed to machine precision.  NaN is returned if the
+        corresponding change in stability does not occur in [0, vmax].
+
+    """
+    if params is None:
+        coeffs = _charpoly
+    else:
+        coeffs = charpoly_coefficients(*whipple_matrices(params))
+    first_order = _first_order(params)
+    shape = coeffs.shape[:-2]
+
+    # Bracket the changes in stability for all parameter values at once
+    v0 = np.linspace(0, vmax, num)
+    stable = whipple_stable(v0.reshape((-1,) + (1,) * len(shape)), coeffs)
+
+    v_weave, v_capsize = np.full(shape, np.nan), np.full(shape, np.nan)
+    for index in np.ndindex(shape):
+        matrices = [X[index] for X in first_order]
+        abscissa = lambda v: np.max(
+            np.linalg.eigvals(_whipple_A(v, *matrices)).real)
+        v_weave[index], v_capsize[index] = _stability_window(
+            v0, stable[(slice(None),) + index], abscissa)
+    return (float(v_weave), float(v_capsize)) if not shape else \
+        (v_weave, v_capsize)
+
+
+# Refine the first stable window on a grid by root finding
+def _stability_window(v0, stable, abscissa):
+    from scipy.optimize import brentq
+
+    v_weave = v0[0] if stable[0] else np.nan
+    v_capsize = np.nan
+    for i in np.flatnonzero(stable[1:] != stable[:-1]):
+        speed = brentq(abscissa, v0[i], v0[i+1],
+                       xtol=1e-300, rtol=4 * np.finfo(float).eps)
+        if stable[i+1] and np.isnan(v_weave):
+            v_weave = speed
+        elif not stable[i+1] and not np.isnan(v_weave):
+            v_capsize = speed
+            break
+    return v_weave, v_capsize
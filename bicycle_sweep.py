@@ -0,0 +1,188 @@
+# bicycle_sweep.py - stability of the bicycle model across geometries
+#
+# Example 5.17 shows that the bicycle model in bicycle.py is stable between
+# the weave speed and the capsize speed.  This module computes these speeds
+# for a large number of bicycle geometries (trail, head angle, wheel base,
+# mass distribution, etc), to explore how the stable speed window depends
+# on the design of the bicycle.
+#
+# The geometries are either sampled at random or laid out on a grid.  They
+# are split into shards that are evaluated in parallel on a process pool
+# using bicycle.whipple_critical_speeds(), which brackets the changes in
+# stability for all of the geometries in a shard at once.  The results are
+# written to a compressed .npz file containing the parameter values and the
+# weave and capsize speeds for each geometry.
+#
+# Usage:
+#   python bicycle_sweep.py [-n NSAMPLES] [-j JOBS] [--seed SEED] [-o FILE]
+
+import os
+
+import numpy as np
+
+import bicycle
+
+# Ranges for the sampled parameters (see bicycle.default_params)
+sample_ranges = {
+    'c': (0., 0.15),                            # trail, m
+    'lambda_angle': (np.pi * 60 / 180, np.pi * 80 / 180),  # head angle, rad
+    'b': (0.9, 1.2),                            # wheel base, m
+    'mrf': (60., 110.),                         # rear frame mass, kg
+    'xrf': (0.3, 0.6),                          # rear frame center of mass, m
+    'zrf': (0.8, 1.2),
+    'mff': (1., 5.),                            # front frame mass, kg
+}
+
+
+def sample_geometries(rng, nsamples, ranges=sample_ranges):
+    """Sample bicycle parameters uniformly.
+
+    Parameters
+    ----------
+    rng : numpy.random.Generator
+        Random number generator.
+    nsamples : int
+        Number of geometries.
+    ranges : dict, optional
+        Range (low, high) for each parameter to sample.  Parameters that
+        are not given keep their default values.
+
+    Returns
+    -------
+    dict
+        Parameter values, as arrays of length `nsamples`.
+
+    """
+    return {name: rng.uniform(low, high, nsamples)
+            for name, (low, high) in ranges.items()}
+
+
+def grid_geometries(**axes):
+    """Lay out bicycle parameters on a grid.
+
+    Parameters
+    ----------
+    **axes : array
+        Values for each parameter to vary, e.g. c=np.linspace(0, 0.15, 31).
+
+    Returns
+    -------
+    dict
+        Parameter values for every point of the grid, as flattened arrays.
+
+    """
+    grid = np.meshgrid(*map(np.asarray, axes.values()), indexing='ij')
+    return {name: values.ravel() for name, values in zip(axes, grid)}
+
+
+def evaluate_shard(geometries, vmax=20., num=201):
+    """Compute the weave and capsize speeds for a set of geometries.
+
+    Parameters
+    ----------
+    geometries : dict
+        Parameter values, as arrays of equal length.
+    vmax, num : optional
+        Velocity range and grid size (see bicycle.whipple_critical_speeds).
+
+    Returns
+    -------
+    v_weave, v_capsize : array
+        Speeds for each geometry (NaN if there is no stable window).
+
+    """
+    params = bicycle.BicycleParams(**geometries)
+    return bicycle.whipple_critical_speeds(vmax, num, params)
+
+
+def run_sweep(geometries, jobs=None, shard_size=1000, **kwargs):
+    """Compute the stable speed window for geometries on a process pool.
+
+    Parameters
+    ----------
+    geometries : dict
+        Parameter values, as arrays of equal length (see
+        `sample_geometries` and `grid_geometries`).
+    jobs : int, optional
+        Number of worker processes (default: number of cores).
+    shard_size : int, optional
+        Number of geometries per shard.
+    **kwargs
+        Additional arguments passed to `evaluate_shard`.
+
+    Returns
+    -------
+    v_weave, v_capsize : array
+        Speeds for each geometry, in the order given.
+
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    nsamples = len(next(iter(geometries.values())))
+    starts = range(0, nsamples, shard_size)
+    v_weave, v_capsize = np.empty(nsamples), np.empty(nsamples)
+    with ProcessPoolExecutor(jobs or os.cpu_count()) as executor:
+        futures = [
+            executor.submit(evaluate_shard, {
+                name: values[start:start + shard_size]
+                for name, values in geometries.items()}, **kwargs)
+            for start in starts]
+        for start, future in zip(starts, futures):
+            weave, capsize = future.result()
+            v_weave[start:start + weave.size] = weave
+            v_capsize[start:start + capsize.size] = capsize
+    return v_weave, v_capsize
+
+
+def save_sweep(filename, geometries, v_weave, v_capsize):
+    """Save the results of a sweep to a .npz file.
+
+    The file contains an array for each parameter that was varied, the
+    weave and capsize speeds, and the names of the parameters ('names').
+
+    """
+    np.savez_compressed(
+        filename, names=np.array(list(geometries)), v_weave=v_weave,
+        v_capsize=v_capsize, **geometries)
+
+
+def main(argv=None):
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(
+        description="Stable speed window of the bicycle across geometries.")
+    parser.add_argument('-n', '--nsamples', type=int, default=10000,
+                        help="number of geometries (default: %(default)s)")
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help="number of worker processes")
+    parser.add_argument('--shard-size', type=int, default=1000,
+                        help="geometries per shard (default: %(default)s)")
+    parser.add_argument('--vmax', type=float, default=20.,
+                        help="largest velocity in m/s (default: %(default)s)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-o', '--output', default='bicycle_sweep.npz',
+                        help="output file (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    geometries = sample_geometries(
+        np.random.default_rng(args.seed), args.nsamples)
+    v_weave, v_capsize = run_sweep(
+        geometries, args.jobs, args.shard_size, vmax=args.vmax)
+    save_sweep(args.output, geometries, v_weave, v_capsize)
+
+    stable = ~np.isnan(v_weave)
+    print("%d geometries in %.1f s, %d with a stable window" % (
+        args.nsamples, time.perf_counter() - start, np.count_nonzero(stable)))
+    if stable.any():
+        print("  weave speed    %.2f - %.2f m/s" % (
+            v_weave[stable].min(), v_weave[stable].max()))
+        capsize = v_capsize[stable & ~np.isnan(v_capsize)]
+        if capsize.size:
+            print("  capsize speed  %.2f - %.2f m/s" % (
+                capsize.min(), capsize.max()))
+
+
+if __name__ == '__main__':
+    main()
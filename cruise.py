@@ -1,6 +1,7 @@
 # cruise.py - Cruise control dynamics and control
 # RMM, 20 Jun 2021
 
+import os
 import numpy as np
 import matplotlib.pyplot as plt
 from math import pi
@@ -16,6 +17,10 @@ import control as ct
 
 # Engine model
 def motor_torque(omega, params={}):
+    # Use a tabulated torque map, if given (see TorqueMap)
+    if params.get('torque_map') is not None:
+        return params['torque_map'](omega)
+
     # Set up the system parameters
     Tm = params.get('Tm', 190.)             # engine torque constant
     omega_m = params.get('omega_m', 420.)   # peak engine angular speed
@@ -24,6 +29,125 @@ def motor_torque(omega, params={}):
     return np.clip(Tm * (1 - beta * (omega/omega_m - 1)**2), 0, None)
 
 
+class TorqueMap:
+    """Tabulated engine torque as a function of engine speed.
+
+    The torque is stored on a uniform grid of engine speeds, so that it
+    can be evaluated for scalar or array arguments at a cost that does not
+    depend on the size of the table.  To use a torque map in the vehicle
+    model, pass it as the 'torque_map' parameter (this replaces the Tm,
+    omega_m and beta parameters).
+
+    Parameters
+    ----------
+    omega : array
+        Engine speeds (uniformly spaced, increasing), in rad/s.
+    torque : array
+        Engine torque at each speed, in N m.  The torque is held constant
+        at the end values for speeds outside the table.
+    method : str, optional
+        Interpolation method: 'linear' (default) or 'cubic' (Catmull-Rom
+        spline).
+
+    """
+    def __init__(self, omega, torque, method='linear'):
+        omega, torque = np.asarray(omega, float), np.asarray(torque, float)
+        if omega.ndim != 1 or omega.shape != torque.shape or omega.size < 2:
+            raise ValueError("omega and torque must be 1D arrays of the "
+                             "same length")
+        spacing = np.diff(omega)
+        if np.any(spacing <= 0) or \
+           not np.allclose(spacing, spacing[0], rtol=1e-9, atol=0):
+            raise ValueError("omega must be uniformly spaced and increasing")
+        if method not in ('linear', 'cubic'):
+            raise ValueError(f"unknown interpolation method '{method}'")
+
+        self.omega, self.torque, self.method = omega, torque, method
+        self._omega0, self._domega = omega[0], spacing[0]
+
+        # Pad the table by linear extrapolation (for the cubic end segments)
+        self._padded = np.concatenate([
+            [2 * torque[0] - torque[1]], torque,
+            [2 * torque[-1] - torque[-2]]])
+        self._values = self._padded.tolist()     # for scalar evaluation
+
+    @classmethod
+    def from_params(cls, params={}, npoints=257, method='linear'):
+        """Tabulate the torque curve given by the motor_torque parameters.
+
+        The table covers the range of speeds for which the torque is
+        positive.
+        """
+        omega_m = params.get('omega_m', 420.)
+        beta = params.get('beta', 0.4)
+        omega = omega_m * np.linspace(
+            1 - 1/np.sqrt(beta), 1 + 1/np.sqrt(beta), npoints)
+        params = {key: value for key, value in params.items()
+                  if key != 'torque_map'}
+        return cls(omega, motor_torque(omega, params), method)
+
+    @classmethod
+    def from_table(cls, omega, torque, npoints=None, method='linear'):
+        """Create a torque map from a measured (non-uniform) table.
+
+        The measured values are resampled (using linear interpolation) onto
+        a uniform grid with `npoints` points (default: twice the number of
+        measured points).
+        """
+        omega, torque = np.asarray(omega, float), np.asarray(torque, float)
+        order = np.argsort(omega)
+        grid = np.linspace(
+            omega[order[0]], omega[order[-1]], npoints or 2 * omega.size)
+        return cls(grid, np.interp(grid, omega[order], torque[order]), method)
+
+    # Grid index and fractional position for a set of engine speeds
+    def _locate(self, omega):
+        position = (np.asarray(omega, float) - self._omega0) / self._domega
+        index = np.clip(np.floor(position), 0, self.torque.size - 2)
+        return index.astype(int), np.clip(position - index, 0, 1)
+
+    def __call__(self, omega):
+        """Engine torque at the given engine speed(s)."""
+        if np.ndim(omega) == 0:
+            # Evaluate scalars using Python floats (avoids NumPy overhead)
+            position = (float(omega) - self._omega0) / self._domega
+            i = min(max(int(position // 1), 0), len(self._values) - 4)
+            t = min(max(position - i, 0.), 1.)
+            p0, p1, p2, p3 = self._values[i:i + 4]
+        else:
+            i, t = self._locate(omega)
+            p = self._padded            # p[i + 1] = torque[i]
+            p0, p1, p2, p3 = p[i], p[i + 1], p[i + 2], p[i + 3]
+
+        if self.method == 'linear':
+            torque = p1 * (1 - t) + p2 * t
+        else:
+            torque = p1 + 0.5 * t * (
+                p2 - p0 + t * (2*p0 - 5*p1 + 4*p2 - p3 +
+                               t * (3*(p1 - p2) + p3 - p0)))
+        return np.maximum(torque, 0) if np.ndim(torque) else max(torque, 0.)
+
+    def derivative(self, omega):
+        """Derivative of the engine torque with respect to engine speed."""
+        omega = np.asarray(omega, float)
+        i, t = self._locate(omega)
+        p = self._padded
+        if self.method == 'linear':
+            slope = p[i + 2] - p[i + 1]
+        else:
+            p0, p1, p2, p3 = p[i], p[i + 1], p[i + 2], p[i + 3]
+            slope = 0.5 * (p2 - p0 + t * (2 * (2*p0 - 5*p1 + 4*p2 - p3) +
+                                          3 * t * (3*(p1 - p2) + p3 - p0)))
+        inside = (omega >= self.omega[0]) & (omega <= self.omega[-1])
+        return np.where(inside & (self(omega) > 0), slope / self._domega, 0.)
+
+    # Data used to identify the map in cache keys
+    @property
+    def cache_key(self):
+        return {'omega': self.omega.tolist(), 'torque': self.torque.tolist(),
+                'method': self.method}
+
+
 # Vehicle dynamics
 def vehicle_update(t, x, u, params={}):
     """Vehicle dynamics for cruise control system.
@@ -102,6 +226,93 @@ vehicle_dynamics = ct.nlsys(
     vehicle_update, None, name='vehicle',
     inputs = ['u', 'gear', 'theta'], outputs = ['v'], states=['v'])
 
+#
+# Vehicle model with fixed parameters
+#
+# The vehicle_update function looks up each parameter on every call, which
+# adds up when the dynamics are integrated over many steps.  The functions
+# below bind a set of parameters once and return an update function (or
+# system) that only does the arithmetic.  The computations are done in the
+# same order as vehicle_update, so the results are identical.
+#
+
+def create_vehicle_update(params={}):
+    """Create a vehicle update function with fixed parameters.
+
+    Parameters
+    ----------
+    params : dict, optional
+        Vehicle parameters (see `vehicle_update` and `motor_torque`).
+        Parameters that are not given are set to their default values.
+
+    Returns
+    -------
+    function
+        Update function update(t, x, u, params=None) that computes the
+        vehicle acceleration.  The params argument is ignored.
+
+    """
+    from math import copysign, sin
+
+    # Engine parameters
+    Tm = params.get('Tm', 190.)
+    omega_m = params.get('omega_m', 420.)
+    beta = params.get('beta', 0.4)
+    torque_map = params.get('torque_map')
+
+    # Vehicle parameters
+    m = params.get('m', 1600.)
+    g = params.get('g', 9.8)
+    alpha = tuple(params.get('alpha', [40, 25, 16, 12, 10]))
+    mg = m * g                                  # weight
+    mgCr = mg * params.get('Cr', 0.01)          # rolling friction
+    drag = 1/2 * params.get('rho', 1.3) * params.get('Cd', 0.32) * \
+        params.get('A', 2.4)                    # aerodynamic drag factor
+
+    def update(t, x, u, params=None):
+        v = x[0]
+        throttle = min(max(u[0], 0), 1)
+        alpha_n = alpha[int(u[1]) - 1]
+
+        # Engine force (see motor_torque)
+        if torque_map is None:
+            torque = max(Tm * (1 - beta * (alpha_n * v / omega_m - 1)**2), 0)
+        else:
+            torque = torque_map(alpha_n * v)
+        F = alpha_n * torque * throttle
+
+        # Disturbance forces: gravity, rolling friction, aerodynamic drag
+        Fd = mg * sin(u[2]) + mgCr * copysign(1, v) + drag * abs(v) * v
+        return (F - Fd) / m
+
+    return update
+
+
+def create_vehicle(params={}, name='vehicle'):
+    """Create a vehicle input/output system with fixed parameters.
+
+    The system has the same inputs, outputs and states as
+    `vehicle_dynamics`, but the parameters are bound when the system is
+    created (and recorded in its `params` attribute), so parameters passed
+    to ct.input_output_response or ct.find_eqpt are ignored.
+
+    Parameters
+    ----------
+    params : dict, optional
+        Vehicle parameters (see `vehicle_update` and `motor_torque`).
+    name : str, optional
+        Name of the system.
+
+    Returns
+    -------
+    NonlinearIOSystem
+        Vehicle dynamics.
+
+    """
+    return ct.nlsys(
+        create_vehicle_update(params), None, name=name, params=dict(params),
+        inputs = ['u', 'gear', 'theta'], outputs = ['v'], states=['v'])
+
 #
 # PI controller
 #
@@ -122,3 +333,848 @@ cruise_PI = ct.interconnect(
     inplist = ['control.u', 'vehicle.gear', 'vehicle.theta'],
     inputs = ['vref', 'gear', 'theta'],
     outlist = ['vehicle.v', 'vehicle.u'], outputs = ['v', 'u'])
+
+
+def create_cruise_PI(params={}, name='cruise'):
+    """Create the closed loop cruise control system with fixed parameters.
+
+    The system is the same as `cruise_PI`, but uses `create_vehicle` for
+    the vehicle dynamics.
+
+    Parameters
+    ----------
+    params : dict, optional
+        Vehicle parameters (see `vehicle_update` and `motor_torque`).
+    name : str, optional
+        Name of the system.
+
+    Returns
+    -------
+    InterconnectedSystem
+        Closed loop system with inputs ['vref', 'gear', 'theta'] and
+        outputs ['v', 'u'].
+
+    """
+    return ct.interconnect(
+        (create_vehicle(params), PI_control), name=name,
+        connections = [
+            ['control.u', '-vehicle.v'], ['vehicle.u', 'control.y']],
+        inplist = ['control.u', 'vehicle.gear', 'vehicle.theta'],
+        inputs = ['vref', 'gear', 'theta'],
+        outlist = ['vehicle.v', 'vehicle.u'], outputs = ['v', 'u'])
+
+#
+# Vehicle ensembles
+#
+# The functions below simulate the closed loop system for a collection
+# ("ensemble") of vehicles with different parameters at the same time.  The
+# state of the ensemble is stored as a single array, so that the dynamics of
+# all of the vehicles can be computed using NumPy operations and integrated
+# in a single call to solve_ivp.
+#
+
+# Parameter values for an ensemble, as arrays that broadcast over vehicles
+def _ensemble_params(params):
+    get = lambda key, default: np.asarray(params.get(key, default), float)
+    return {
+        'Tm': get('Tm', 190.), 'omega_m': get('omega_m', 420.),
+        'beta': get('beta', 0.4), 'm': get('m', 1600.), 'g': get('g', 9.8),
+        'Cr': get('Cr', 0.01), 'Cd': get('Cd', 0.32), 'rho': get('rho', 1.3),
+        'A': get('A', 2.4), 'alpha': get('alpha', [40, 25, 16, 12, 10]),
+        'torque_map': params.get('torque_map')}
+
+
+def vehicle_update_ensemble(t, x, u, params={}):
+    """Vehicle dynamics for an ensemble of vehicles.
+
+    Parameters
+    ----------
+    x : array
+        Stacked system states, with shape (1, N) for N vehicles.
+    u : array
+        Stacked system inputs [throttle, gear, road_slope], with shape
+        (3, N) (or any shape that broadcasts to it).
+    params : dict, optional
+        Vehicle parameters (see `vehicle_update` and `motor_torque`).  Each
+        parameter other than 'alpha' can be a scalar or an array of
+        length N, giving the value for each vehicle.
+
+    Returns
+    -------
+    array
+        Vehicle accelerations, with shape (N,).
+
+    """
+    return _vehicle_accel(*x, *u, _ensemble_params(params))
+
+
+# Vehicle acceleration, with parameters from _ensemble_params()
+def _vehicle_accel(v, throttle, gear, theta, p):
+    throttle = np.clip(throttle, 0, 1)
+    alpha = p['alpha'][np.asarray(gear).astype(int) - 1]
+
+    # Force generated by the engine
+    F = alpha * motor_torque(alpha * v, p) * throttle
+
+    # Disturbance forces: gravity, rolling friction, aerodynamic drag
+    Fg = p['m'] * p['g'] * np.sin(theta)
+    Fr = p['m'] * p['g'] * p['Cr'] * np.copysign(1, v)
+    Fa = 1/2 * p['rho'] * p['Cd'] * p['A'] * np.abs(v) * v
+    return (F - (Fg + Fr + Fa)) / p['m']
+
+
+# State space realization of the PI controller (as used in cruise_PI)
+def _PI_matrices():
+    sys = ct.ss(PI_control)
+    return tuple(float(M[0, 0]) for M in (sys.A, sys.B, sys.C, sys.D))
+
+
+def cruise_PI_equilibrium(vref, gear=4, theta=0, params={}):
+    """Equilibrium states of cruise_PI for an ensemble of vehicles.
+
+    Computes the states of `cruise_PI` at which the vehicle travels at
+    velocity `vref` with constant throttle.  This is the same equilibrium
+    as computed by ct.find_eqpt(cruise_PI, ..., iu=[1, 2], y0=[vref, 0],
+    iy=[0]), but computed in closed form for all vehicles at once (the
+    throttle is linear in the engine force).
+
+    Parameters
+    ----------
+    vref : float or array
+        Vehicle velocity.
+    gear, theta : float or array, optional
+        Gear and road slope.
+    params : dict, optional
+        Vehicle parameters (scalars or arrays, see `vehicle_update_ensemble`).
+
+    Returns
+    -------
+    X0 : array
+        Equilibrium states [v, controller state], with shape (2, N).
+    throttle : array
+        Equilibrium throttle, with shape (N,).  Values outside [0, 1] mean
+        that there is no equilibrium at the given velocity.
+
+    """
+    p = _ensemble_params(params)
+    vref, gear, theta = np.broadcast_arrays(
+        *(np.atleast_1d(np.asarray(arg, float))
+          for arg in (vref, gear, theta)), p['m'])[:3]
+
+    # Throttle required to balance the disturbance forces
+    alpha = p['alpha'][gear.astype(int) - 1]
+    Fd = p['m'] * p['g'] * np.sin(theta) + \
+        p['m'] * p['g'] * p['Cr'] * np.copysign(1, vref) + \
+        1/2 * p['rho'] * p['Cd'] * p['A'] * np.abs(vref) * vref
+    throttle = Fd / (alpha * motor_torque(alpha * vref, p))
+
+    # Controller state and error giving this throttle: A xc + B e = 0 and
+    # C xc + D e = throttle
+    Ac, Bc, Cc, Dc = _PI_matrices()
+    xc = throttle * Bc / (Bc * Cc - Ac * Dc)
+    return np.array([vref, xc]), throttle
+
+
+def cruise_PI_ensemble(T, U, params={}, X0=None, **solve_ivp_kwargs):
+    """Simulate cruise_PI for an ensemble of vehicles.
+
+    The closed loop dynamics of all vehicles are integrated together in a
+    single call to scipy.integrate.solve_ivp, with the step size set by the
+    most demanding vehicle.  The results therefore agree with separate
+    simulations of `cruise_PI` to within the solver tolerance.
+
+    Parameters
+    ----------
+    T : array
+        Time points at which to return the response.
+    U : array
+        Inputs [vref, gear, theta] with shape (3, len(T)) (same inputs for
+        all vehicles) or (3, N, len(T)).  As in ct.input_output_response,
+        the inputs are linearly interpolated between time points.
+    params : dict, optional
+        Vehicle parameters.  Each parameter other than 'alpha' can be an
+        array of length N, giving the value for each vehicle.
+    X0 : array, optional
+        Initial states with shape (2, N).  If not given, the vehicles start
+        at the equilibrium for the initial inputs (see
+        `cruise_PI_equilibrium`).
+    **solve_ivp_kwargs
+        Additional arguments passed to scipy.integrate.solve_ivp.  For the
+        implicit methods ('BDF', 'Radau' and 'LSODA'), the analytic
+        Jacobian of the ensemble (see `cruise_PI_jacobian`) is passed to
+        the solver as a sparse matrix.
+
+    Returns
+    -------
+    t : array
+        Time points.
+    y : array
+        Outputs [v, u] (velocity and throttle command), with shape
+        (2, N, len(T)).
+
+    """
+    import scipy.integrate
+
+    T = np.asarray(T, float)
+    U = np.asarray(U, float)
+    p = _ensemble_params(params)
+
+    # Figure out the number of vehicles
+    N = np.broadcast_shapes(
+        *(value.shape for key, value in p.items()
+          if key not in ('alpha', 'torque_map')),
+        U.shape[1:-1], () if X0 is None else np.shape(X0)[1:])
+    N = N[0] if N else 1
+    U = np.broadcast_to(U if U.ndim == 3 else U[:, None, :], (3, N, T.size))
+
+    if X0 is None:
+        X0, _ = cruise_PI_equilibrium(U[0, :, 0], U[1, :, 0], U[2, :, 0], p)
+    X0 = np.broadcast_to(X0, (2, N))
+    Ac, Bc, Cc, Dc = _PI_matrices()
+
+    # Inputs at time t (linear interpolation, as in input_output_response)
+    def inputs(t):
+        idx = min(max(np.searchsorted(T, t, side='left'), 1), T.size - 1)
+        dt = (t - T[idx-1]) / (T[idx] - T[idx-1])
+        return U[..., idx-1] * (1. - dt) + U[..., idx] * dt
+
+    def rhs(t, x):
+        vref, gear, theta = inputs(t)
+        v, xc = x[:N], x[N:]
+        e = vref - v
+        throttle = Cc * xc + Dc * e
+        dv = _vehicle_accel(v, throttle, gear, theta, p)
+        return np.concatenate([dv, Ac * xc + Bc * e])
+
+    def jac(t, x):
+        # Block diagonal Jacobian: the vehicles are independent
+        import scipy.sparse
+        vref, gear, theta = inputs(t)
+        v, xc = x[:N], x[N:]
+        throttle = Cc * xc + Dc * (vref - v)
+        dv_dv, dv_du, _ = _vehicle_partials(v, throttle, gear, theta, p)
+        return scipy.sparse.bmat([
+            [scipy.sparse.diags(dv_dv - dv_du * Dc),
+             scipy.sparse.diags(dv_du * Cc)],
+            [scipy.sparse.diags(np.full(N, -Bc)),
+             scipy.sparse.diags(np.full(N, Ac))]], format='csc')
+
+    if solve_ivp_kwargs.get('method') in ('BDF', 'Radau', 'LSODA'):
+        solve_ivp_kwargs.setdefault('jac', jac)
+
+    soln = scipy.integrate.solve_ivp(
+        rhs, (T[0], T[-1]), np.ravel(X0), t_eval=T, **solve_ivp_kwargs)
+    if not soln.success:
+        raise RuntimeError("solve_ivp failed: " + soln.message)
+
+    v, xc = soln.y[:N], soln.y[N:]
+    return soln.t, np.array([v, Cc * xc + Dc * (U[0] - v)])
+
+#
+# Jacobians
+#
+# The derivatives of the vehicle dynamics can be computed analytically,
+# which avoids the finite difference approximations used by ct.find_eqpt()
+# and the linearize() method (which are sensitive to the saturation of the
+# throttle and engine torque).  The saturations and the sign of the
+# velocity are treated as locally constant.
+#
+
+def motor_torque_derivative(omega, params={}):
+    """Derivative of the engine torque with respect to the engine speed."""
+    if params.get('torque_map') is not None:
+        return params['torque_map'].derivative(omega)
+
+    Tm = params.get('Tm', 190.)             # engine torque constant
+    omega_m = params.get('omega_m', 420.)   # peak engine angular speed
+    beta = params.get('beta', 0.4)          # peak engine rolloff
+
+    return np.where(
+        motor_torque(omega, params) > 0,
+        -2 * Tm * beta * (omega/omega_m - 1) / omega_m, 0.)
+
+
+# Partial derivatives of the vehicle acceleration with respect to the
+# velocity, throttle and road slope (parameters from _ensemble_params())
+def _vehicle_partials(v, throttle, gear, theta, p):
+    alpha = p['alpha'][np.asarray(gear).astype(int) - 1]
+    omega = alpha * v
+    unsaturated = (throttle > 0) & (throttle < 1)
+    throttle = np.clip(throttle, 0, 1)
+
+    dv_dv = (alpha**2 * motor_torque_derivative(omega, p) * throttle -
+             p['rho'] * p['Cd'] * p['A'] * np.abs(v)) / p['m']
+    dv_du = np.where(unsaturated, alpha * motor_torque(omega, p), 0.) / p['m']
+    dv_dtheta = -p['g'] * np.cos(theta)
+    return dv_dv, dv_du, dv_dtheta
+
+
+def vehicle_jacobian(x, u, params={}):
+    """Jacobian of the vehicle dynamics.
+
+    Parameters
+    ----------
+    x : array
+        System state [v].
+    u : array
+        System input [throttle, gear, road_slope].
+    params : dict, optional
+        Vehicle parameters (see `vehicle_update` and `motor_torque`).
+
+    Returns
+    -------
+    A : array
+        Derivative of the acceleration with respect to the state (1x1).
+    B : array
+        Derivative of the acceleration with respect to the inputs (1x3).
+        The derivative with respect to the gear is zero.
+
+    """
+    dv_dv, dv_du, dv_dtheta = _vehicle_partials(
+        float(x[0]), float(u[0]), u[1], float(u[2]), _ensemble_params(params))
+    return np.array([[dv_dv]]), np.array([[dv_du, 0., dv_dtheta]])
+
+
+def cruise_PI_jacobian(x, u, params={}):
+    """Jacobian of the closed loop cruise control system.
+
+    Parameters
+    ----------
+    x : array
+        System state [v, controller state].
+    u : array
+        System input [vref, gear, theta].
+    params : dict, optional
+        Vehicle parameters (see `vehicle_update` and `motor_torque`).
+
+    Returns
+    -------
+    A, B, C, D : array
+        Derivatives of the state derivative (A, B) and the outputs [v, u]
+        (C, D) with respect to the states and inputs of `cruise_PI`.
+
+    """
+    Ac, Bc, Cc, Dc = _PI_matrices()
+    throttle = Cc * x[1] + Dc * (u[0] - x[0])
+    Av, Bv = vehicle_jacobian(x[:1], [throttle, u[1], u[2]], params)
+    dv_dv, (dv_du, _, dv_dtheta) = Av[0, 0], Bv[0]
+
+    A = np.array([[dv_dv - dv_du * Dc, dv_du * Cc], [-Bc, Ac]])
+    B = np.array([[dv_du * Dc, 0, dv_dtheta], [Bc, 0, 0]])
+    C = np.array([[1, 0], [-Dc, Cc]])
+    D = np.array([[0, 0, 0], [Dc, 0, 0]])
+    return A, B, C, D
+
+
+def vehicle_equilibrium(v, gear=4, theta=0, params={}):
+    """Equilibrium throttle for the vehicle at a given velocity.
+
+    Computes the same equilibrium as ct.find_eqpt(vehicle_dynamics, v,
+    u0=[0, gear, theta], iu=[1, 2], y0=v, iy=[0]), using Newton's method
+    with the analytic Jacobian.  Since the acceleration is affine in the
+    throttle, this converges in a single step unless the throttle
+    saturates.
+
+    Parameters
+    ----------
+    v : float
+        Vehicle velocity.
+    gear, theta : float, optional
+        Gear and road slope.
+    params : dict, optional
+        Vehicle parameters (see `vehicle_update` and `motor_torque`).
+
+    Returns
+    -------
+    xe, ue : array
+        Equilibrium state [v] and input [throttle, gear, theta].
+
+    Raises
+    ------
+    ValueError
+        If the vehicle cannot maintain the velocity (throttle > 1).
+
+    """
+    xe, ue = np.array([v], float), np.array([0.5, gear, theta], float)
+    update = create_vehicle_update(params)
+    for _ in range(10):
+        _, B = vehicle_jacobian(xe, ue, params)
+        if B[0, 0] == 0:
+            break
+        step = update(0, xe, ue) / B[0, 0]
+        ue[0] -= step
+        if abs(step) <= 1e-12 * max(abs(ue[0]), 1):
+            break
+    if not 0 <= ue[0] <= 1 or abs(update(0, xe, ue)) > 1e-10:
+        raise ValueError(
+            "no equilibrium with throttle in [0, 1] at v = %g" % v)
+    return xe, ue
+
+
+def linearize_vehicle(xe, ue, params={}, name=None):
+    """Linearize the vehicle dynamics using the analytic Jacobian.
+
+    Parameters
+    ----------
+    xe, ue : array
+        Operating point (state and input).
+    params : dict, optional
+        Vehicle parameters (see `vehicle_update` and `motor_torque`).
+    name : str, optional
+        Name of the linear system.
+
+    Returns
+    -------
+    StateSpace
+        Linear system with the same inputs, outputs and states as
+        `vehicle_dynamics`.
+
+    """
+    A, B = vehicle_jacobian(xe, ue, params)
+    return ct.ss(
+        A, B, [[1]], [[0, 0, 0]], name=name,
+        inputs=vehicle_dynamics.input_labels,
+        outputs=vehicle_dynamics.output_labels,
+        states=vehicle_dynamics.state_labels)
+
+#
+# Trim table
+#
+# Scenario setup requires the equilibrium (trim) throttle for a given
+# velocity, gear, road slope and vehicle mass.  The TrimTable class
+# computes the trim throttle over a grid of operating points in a single
+# vectorized computation and stores it in .fbs_cache/ so that it is only
+# computed once.  Lookups interpolate in the table and then take one Newton
+# step using the analytic Jacobian, which removes the interpolation error.
+#
+
+# Location of the cached tables (ignored by git)
+cache_dir = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '.fbs_cache')
+
+
+# Load a set of arrays from the cache, computing them if needed.  The cache
+# key includes the grid, the parameters and the contents of this file.
+def _cached_arrays(kind, grid, params, compute, cache=True):
+    import hashlib
+    import json
+    digest = hashlib.sha256()
+    digest.update(json.dumps({
+        'grid': {key: np.asarray(value).tolist()
+                 for key, value in grid.items()},
+        'params': {key: value.cache_key if hasattr(value, 'cache_key')
+                   else np.asarray(value).tolist()
+                   for key, value in sorted(params.items())},
+    }).encode())
+    with open(__file__, 'rb') as file:
+        digest.update(file.read())
+    filename = os.path.join(cache_dir, kind, digest.hexdigest()[:16] + '.npz')
+
+    if cache and os.path.exists(filename):
+        with np.load(filename) as data:
+            return dict(data)
+    arrays = compute()
+    if cache:
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        tmpname = filename + '.%d.tmp.npz' % os.getpid()
+        np.savez_compressed(tmpname, **arrays)
+        os.replace(tmpname, filename)
+    return arrays
+
+
+# Default grid for the trim table
+trim_grid = {
+    'vref': np.linspace(5, 40, 71),         # velocity, m/s
+    'theta': np.linspace(-0.15, 0.15, 31),  # road slope, rad
+    'm': np.linspace(800, 3000, 23),        # vehicle mass, kg
+}
+
+
+class TrimTable:
+    """Table of trim throttle values for the vehicle.
+
+    Parameters
+    ----------
+    grid : dict, optional
+        Grid points for 'vref', 'theta' and 'm' (default: `trim_grid`).
+        The table is computed for each gear.
+    params : dict, optional
+        Values of the other vehicle parameters (see `vehicle_update`).
+    cache : bool, optional
+        If True (default), load the table from .fbs_cache/trim if it has
+        already been computed, and save it there otherwise.  The cache key
+        includes the grid, the parameters and the contents of cruise.py.
+
+    Attributes
+    ----------
+    throttle : array
+        Trim throttle, with shape (ngears, len(vref), len(theta), len(m)).
+        Values outside [0, 1] mean that the operating point cannot be
+        maintained (these are limited to the range [-1, 2]).
+
+    """
+    def __init__(self, grid=None, params={}, cache=True):
+        grid = trim_grid if grid is None else grid
+        self.grid = {key: np.asarray(grid[key], float) for key in trim_grid}
+        self.params = {key: value for key, value in params.items()
+                       if key != 'm'}
+        self.ngears = len(self.params.get('alpha', [40, 25, 16, 12, 10]))
+
+        self.throttle = _cached_arrays(
+            'trim', self.grid, self.params,
+            lambda: {'throttle': self._compute()}, cache)['throttle']
+
+        from scipy.interpolate import RegularGridInterpolator
+        points = tuple(self.grid[key] for key in trim_grid)
+        self._interpolators = [
+            RegularGridInterpolator(
+                points, table, bounds_error=False, fill_value=None)
+            for table in self.throttle]
+
+    # Compute the table for all gears and grid points at once
+    def _compute(self):
+        gear, vref, theta, m = np.meshgrid(
+            np.arange(1, self.ngears + 1), *self.grid.values(),
+            indexing='ij')
+        with np.errstate(divide='ignore'):
+            _, throttle = cruise_PI_equilibrium(
+                vref.ravel(), gear.ravel(), theta.ravel(),
+                dict(self.params, m=m.ravel()))
+
+        # Limit the values at infeasible points (including those where the
+        # engine produces no torque) so that interpolation remains finite
+        return np.clip(throttle, -1, 2).reshape(vref.shape)
+
+    def lookup(self, vref, gear=4, theta=0, m=1600., refine=True):
+        """Trim throttle for one or more operating points.
+
+        Parameters
+        ----------
+        vref, gear, theta, m : float or array
+            Operating points (velocity, gear, road slope and mass).  Points
+            outside the grid are extrapolated linearly.
+        refine : bool, optional
+            If True (default), refine the interpolated value with one
+            Newton step on the vehicle dynamics.
+
+        Returns
+        -------
+        array
+            Trim throttle for each operating point.
+
+        """
+        vref, gear, theta, m = np.broadcast_arrays(
+            *(np.asarray(arg, float) for arg in (vref, gear, theta, m)))
+        gear = gear.astype(int)
+        throttle = np.empty(vref.shape)
+        for n in np.unique(gear):
+            index = gear == n
+            throttle[index] = self._interpolators[n - 1](np.stack(
+                [vref[index], theta[index], m[index]], axis=-1))
+        if not refine:
+            return throttle
+
+        # Newton step (only for points where the throttle is not saturated)
+        p = _ensemble_params(dict(self.params, m=m))
+        f = _vehicle_accel(vref, throttle, gear, theta, p)
+        _, dv_du, _ = _vehicle_partials(vref, throttle, gear, theta, p)
+        return throttle - np.divide(
+            f, dv_du, out=np.zeros_like(f), where=dv_du != 0)
+
+    def vehicle_trim(self, v, gear=4, theta=0, m=1600.):
+        """Equilibrium state and input for `vehicle_dynamics`.
+
+        Returns the same values as `vehicle_equilibrium`, using the table.
+
+        """
+        throttle = self.lookup(v, gear, theta, m)
+        return np.array([v], float), np.array([throttle, gear, theta], float)
+
+    def cruise_PI_trim(self, vref, gear=4, theta=0, m=1600.):
+        """Equilibrium state for `cruise_PI` (see `cruise_PI_equilibrium`).
+
+        Returns
+        -------
+        X0 : array
+            Equilibrium states [v, controller state] (for array arguments,
+            the states are stacked along the last axis).
+
+        """
+        throttle = self.lookup(vref, gear, theta, m)
+        Ac, Bc, Cc, Dc = _PI_matrices()
+        return np.array([
+            np.broadcast_to(vref, throttle.shape),
+            throttle * Bc / (Bc * Cc - Ac * Dc)])
+
+#
+# Linear parameter varying (LPV) model
+#
+# Gain scheduled controllers are designed using linearizations of the
+# vehicle dynamics across the operating envelope.  The VehicleLPV class
+# computes the linearization at the trim point for each gear on a grid of
+# velocities and road slopes (using the analytic Jacobian), caches the
+# resulting A, B, C, D arrays in .fbs_cache/, and interpolates between the
+# grid points to return the local linear model.
+#
+
+# Default grid for the LPV model
+lpv_grid = {
+    'v': np.linspace(5, 40, 36),            # velocity, m/s
+    'theta': np.linspace(-0.1, 0.1, 21),    # road slope, rad
+}
+
+
+class VehicleLPV:
+    """Family of linearizations of the vehicle dynamics.
+
+    Parameters
+    ----------
+    grid : dict, optional
+        Grid points for 'v' and 'theta' (default: `lpv_grid`).  The
+        linearizations are computed for each gear.
+    params : dict, optional
+        Vehicle parameters (see `vehicle_update`).
+    cache : bool, optional
+        If True (default), load the linearizations from .fbs_cache/lpv if
+        they have already been computed, and save them there otherwise.
+
+    Attributes
+    ----------
+    A, B, C, D : array
+        Linearizations at the grid points, with shape (ngears, len(v),
+        len(theta), n, m) for an n x m matrix.
+    throttle : array
+        Trim throttle at the grid points.  Values outside [0, 1] mean that
+        the operating point cannot be maintained; the linearization at
+        these points uses the saturated throttle.
+
+    """
+    def __init__(self, grid=None, params={}, cache=True):
+        grid = lpv_grid if grid is None else grid
+        self.grid = {key: np.asarray(grid[key], float) for key in lpv_grid}
+        self.params = dict(params)
+        self.ngears = len(self.params.get('alpha', [40, 25, 16, 12, 10]))
+
+        arrays = _cached_arrays(
+            'lpv', self.grid, self.params, self._compute, cache)
+        for key in ['A', 'B', 'C', 'D', 'throttle']:
+            setattr(self, key, arrays[key])
+
+        # Interpolate all of the matrix entries at once for each gear
+        from scipy.interpolate import RegularGridInterpolator
+        self._shapes = [M.shape[3:] for M in (self.A, self.B, self.C, self.D)]
+        values = np.concatenate(
+            [M.reshape(M.shape[:3] + (-1,))
+             for M in (self.A, self.B, self.C, self.D)], axis=-1)
+        points = tuple(self.grid[key] for key in lpv_grid)
+        self._interpolators = [
+            RegularGridInterpolator(
+                points, table, bounds_error=False, fill_value=None)
+            for table in values]
+
+    # Compute the linearizations for all gears and grid points at once
+    def _compute(self):
+        gear, v, theta = np.meshgrid(
+            np.arange(1, self.ngears + 1), *self.grid.values(),
+            indexing='ij')
+        with np.errstate(divide='ignore'):
+            _, throttle = cruise_PI_equilibrium(v, gear, theta, self.params)
+        throttle = np.clip(throttle, -1, 2)
+
+        dv_dv, dv_du, dv_dtheta = _vehicle_partials(
+            v, np.clip(throttle, 0, 1), gear, theta,
+            _ensemble_params(self.params))
+        shape = v.shape
+        return {
+            'A': dv_dv.reshape(shape + (1, 1)),
+            'B': np.stack([dv_du, np.zeros(shape), dv_dtheta],
+                          axis=-1).reshape(shape + (1, 3)),
+            'C': np.ones(shape + (1, 1)),
+            'D': np.zeros(shape + (1, 3)),
+            'throttle': throttle}
+
+    def matrices(self, v, gear=4, theta=0):
+        """Interpolated linearization at one or more operating points.
+
+        Parameters
+        ----------
+        v, gear, theta : float or array
+            Operating points (velocity, gear and road slope).  Points
+            outside the grid are extrapolated linearly.
+
+        Returns
+        -------
+        A, B, C, D : array
+            System matrices, with shape (..., n, m) where ... is the shape
+            of the operating points.
+
+        """
+        v, gear, theta = np.broadcast_arrays(
+            *(np.asarray(arg, float) for arg in (v, gear, theta)))
+        gear = gear.astype(int)
+        values = np.empty(v.shape + (self._interpolators[0].values.shape[-1],))
+        for n in np.unique(gear):
+            index = gear == n
+            values[index] = self._interpolators[n - 1](
+                np.stack([v[index], theta[index]], axis=-1))
+
+        matrices, start = [], 0
+        for shape in self._shapes:
+            size = int(np.prod(shape))
+            matrices.append(
+                values[..., start:start + size].reshape(v.shape + shape))
+            start += size
+        return tuple(matrices)
+
+    def linearize(self, v, gear=4, theta=0, name=None):
+        """Local linear model at an operating point.
+
+        Returns
+        -------
+        StateSpace
+            Linear system with the same inputs, outputs and states as
+            `vehicle_dynamics` (see `linearize_vehicle`).
+
+        """
+        A, B, C, D = self.matrices(v, gear, theta)
+        return ct.ss(
+            A, B, C, D, name=name,
+            inputs=vehicle_dynamics.input_labels,
+            outputs=vehicle_dynamics.output_labels,
+            states=vehicle_dynamics.state_labels)
+
+
+#
+# Gear shifting
+#
+# In vehicle_dynamics the gear is an input, so gear shifting logic has to
+# be evaluated on the simulation time grid.  The function below treats the
+# gear as a discrete state instead: the dynamics are integrated with a
+# fixed gear until the engine speed crosses a shift threshold (detected as
+# a zero crossing by solve_ivp), at which point the gear is changed and
+# integration continues from the shift time.
+#
+
+def gearshift_response(
+        sys, T, U, X0, gear=1, params={}, omega_up=None, omega_down=None,
+        **solve_ivp_kwargs):
+    """Simulate a vehicle system with automatic gear shifting.
+
+    Parameters
+    ----------
+    sys : NonlinearIOSystem
+        System with a 'gear' input and a 'v' output, such as
+        `vehicle_dynamics` or `cruise_PI`.
+    T : array
+        Time points at which to return the response.
+    U : array
+        Inputs to the system other than the gear, with shape
+        (ninputs - 1, len(T)) (linearly interpolated between time points).
+    X0 : array
+        Initial state.
+    gear : int, optional
+        Initial gear.  If the initial engine speed is outside of the shift
+        thresholds, the gear is changed at the start of the simulation.
+    params : dict, optional
+        System parameters (passed to the system and used to compute the
+        engine speed).
+    omega_up, omega_down : float, optional
+        Engine speeds (in rad/s) at which to shift up and down (default:
+        1.2 and 0.6 times the peak engine speed omega_m).  These should be
+        far enough apart that the engine speed after a shift is between
+        the two thresholds.
+    **solve_ivp_kwargs
+        Additional arguments passed to scipy.integrate.solve_ivp.
+
+    Returns
+    -------
+    TimeResponseData
+        Response of the system, with the gear included in the inputs.  The
+        `shifts` attribute is a list of (time, old gear, new gear) tuples.
+
+    """
+    import scipy.integrate
+
+    T = np.asarray(T, float)
+    params = dict(sys.params, **params)
+    alpha = params.get('alpha', [40, 25, 16, 12, 10])
+    omega_m = params.get('omega_m', 420.)
+    omega_up = 1.2 * omega_m if omega_up is None else omega_up
+    omega_down = 0.6 * omega_m if omega_down is None else omega_down
+    igear, iv = sys.find_input('gear'), sys.find_output('v')
+    U = np.asarray(U, float).reshape(sys.ninputs - 1, T.size)
+
+    # Full input vector (including the gear) at time t
+    def inputs(t, gear):
+        idx = np.clip(np.searchsorted(T, t, side='left'), 1, T.size - 1)
+        dt = (t - T[idx-1]) / (T[idx] - T[idx-1])
+        return np.insert(U[:, idx-1] * (1. - dt) + U[:, idx] * dt, igear, gear)
+
+    # Engine speed as a function of the state
+    def engine_speed(t, x, gear):
+        return alpha[gear - 1] * sys.output(t, x, inputs(t, gear), params)[iv]
+
+    # Shift at the start if the engine speed is already past a threshold
+    # (the events below only detect crossings of the thresholds)
+    t, x = T[0], np.array(X0, float)
+    times, states, gears, shifts = [], [], [], []
+    while gear < len(alpha) and engine_speed(t, x, gear) > omega_up:
+        shifts.append((float(t), gear, gear + 1))
+        gear += 1
+    while not shifts and gear > 1 and engine_speed(t, x, gear) < omega_down:
+        shifts.append((float(t), gear, gear - 1))
+        gear -= 1
+
+    while True:
+        # Shift events for the current gear: (event function, gear change)
+        events = []
+        if gear < len(alpha):
+            events.append((
+                lambda t, x, gear=gear: engine_speed(t, x, gear) - omega_up,
+                1))
+        if gear > 1:
+            events.append((
+                lambda t, x, gear=gear: engine_speed(t, x, gear) - omega_down,
+                -1))
+        for event, change in events:
+            event.terminal, event.direction = True, change
+
+        soln = scipy.integrate.solve_ivp(
+            lambda t, x, gear=gear: sys.dynamics(
+                t, x, inputs(t, gear), params),
+            (t, T[-1]), x, t_eval=T[T >= t],
+            events=[event for event, _ in events], **solve_ivp_kwargs)
+        if not soln.success:
+            raise RuntimeError("solve_ivp failed: " + soln.message)
+
+        if soln.status != 1:
+            # Reached the end of the simulation
+            times.append(soln.t)
+            states.append(soln.y)
+            gears.append(np.full(soln.t.size, gear))
+            break
+
+        # Save the points before the shift and continue in the new gear
+        index = next(i for i, te in enumerate(soln.t_events) if te.size)
+        t, x = soln.t_events[index][0], soln.y_events[index][0]
+        keep = soln.t < t
+        times.append(soln.t[keep])
+        states.append(soln.y[:, keep])
+        gears.append(np.full(np.count_nonzero(keep), gear))
+        shifts.append((float(t), gear, gear + events[index][1]))
+        gear += events[index][1]
+
+    # Compute the inputs and outputs at the time points
+    time, states = np.concatenate(times), np.hstack(states)
+    gears = np.concatenate(gears)
+    u = np.array([inputs(t, gear) for t, gear in zip(time, gears)]).T
+    y = np.array([
+        sys.output(t, x, u, params)
+        for t, x, u in zip(time, states.T, u.T)]).T
+
+    response = ct.TimeResponseData(
+        time, y, states, u, sysname=sys.name,
+        output_labels=sys.output_labels, state_labels=sys.state_labels,
+        input_labels=sys.input_labels, params=params)
+    response.shifts = shifts
+    return response
@@ -0,0 +1,252 @@
+# cruise_cycle.py - cruise control simulation over long drive cycles
+#
+# The cruise control figures simulate the closed loop system for 25-30
+# seconds.  This module simulates cruise.cruise_PI over recorded drive
+# cycles (speed reference and road slope) that can be hours long and
+# contain millions of samples.  The drive cycle is read from a memory
+# mapped array and integrated one window at a time, carrying the state from
+# one window to the next, and the outputs are either returned one window at
+# a time or written to a memory mapped file.  Memory use therefore does not
+# depend on the length of the drive cycle.
+#
+# Drive cycles are stored as .npy files containing an array with one row per
+# sample and columns [t, vref, theta] or [t, vref, theta, gear].  The output
+# file has one row per sample and columns [v, u] (velocity and throttle).
+#
+# Usage:
+#   python cruise_cycle.py --generate HOURS cycle.npy   # synthetic cycle
+#   python cruise_cycle.py cycle.npy -o response.npy    # simulate
+
+import numpy as np
+import control as ct
+
+import cruise
+
+
+def load_cycle(cycle):
+    """Open a drive cycle as a (memory mapped) array.
+
+    Parameters
+    ----------
+    cycle : str or array
+        Name of a .npy file or an array with columns [t, vref, theta] and
+        (optionally) gear.
+
+    Returns
+    -------
+    array
+        Drive cycle, memory mapped if read from a file.
+
+    """
+    if isinstance(cycle, str):
+        cycle = np.load(cycle, mmap_mode='r')
+    if cycle.ndim != 2 or cycle.shape[1] not in (3, 4):
+        raise ValueError("drive cycle must have columns [t, vref, theta] "
+                         "or [t, vref, theta, gear]")
+    return cycle
+
+
+def simulate_cycle(cycle, gear=4, params={}, X0=None, window=10000,
+                   **solve_ivp_kwargs):
+    """Simulate the cruise controller over a drive cycle.
+
+    The inputs are linearly interpolated between samples (as in
+    ct.input_output_response) and the outputs are computed at the sample
+    times.  Unless `max_step` is given, the integration step is limited to
+    the sample spacing, so that the solver does not step over changes in
+    the inputs.  The result then does not depend on the window size (to
+    within the solver tolerances).
+
+    Parameters
+    ----------
+    cycle : str or array
+        Drive cycle (see `load_cycle`).
+    gear : int, optional
+        Gear to use if the drive cycle does not include a gear column.
+    params : dict, optional
+        Vehicle parameters (see `cruise.vehicle_update`).
+    X0 : array, optional
+        Initial state [v, controller state].  Default is the equilibrium
+        for the first sample of the drive cycle.
+    window : int, optional
+        Number of samples to integrate at a time.
+    **solve_ivp_kwargs
+        Additional arguments passed to scipy.integrate.solve_ivp.
+
+    Yields
+    ------
+    start : int
+        Index of the first sample in the window.
+    y : array
+        Outputs [v, u] for the samples in the window, with shape
+        (nsamples, 2).
+
+    """
+    import scipy.integrate
+
+    cycle = load_cycle(cycle)
+    nsamples = cycle.shape[0]
+    update = cruise.create_vehicle_update(params)
+    PI = ct.ss(cruise.PI_control)
+    Ac, Bc, Cc, Dc = (float(M[0, 0]) for M in (PI.A, PI.B, PI.C, PI.D))
+
+    # Initial state
+    first = np.array(cycle[0])
+    gear0 = first[3] if first.size > 3 else gear
+    if X0 is None:
+        X0, _ = cruise.cruise_PI_equilibrium(
+            first[1], gear0, first[2], params)
+        X0 = X0[:, 0]
+    x = np.array(X0, float)
+
+    start = 0
+    while start < nsamples:
+        # Copy the window (plus the first sample of the next window) into
+        # memory, so that the drive cycle is read sequentially
+        stop = min(start + window, nsamples)
+        chunk = np.array(cycle[start:min(stop + 1, nsamples)], float)
+        T = chunk[:, 0]
+        vref, theta = chunk[:, 1], chunk[:, 2]
+        gears = chunk[:, 3] if chunk.shape[1] > 3 else np.full(T.size, gear)
+
+        def rhs(t, x):
+            idx = min(max(np.searchsorted(T, t, side='left'), 1), T.size - 1)
+            dt = (t - T[idx-1]) / (T[idx] - T[idx-1])
+            u = [vref[idx-1] * (1. - dt) + vref[idx] * dt,
+                 gears[idx-1] * (1. - dt) + gears[idx] * dt,
+                 theta[idx-1] * (1. - dt) + theta[idx] * dt]
+            e = u[0] - x[0]
+            throttle = Cc * x[1] + Dc * e
+            return [update(t, x, [throttle, u[1], u[2]]),
+                    Ac * x[1] + Bc * e]
+
+        if T.size > 1:
+            soln = scipy.integrate.solve_ivp(
+                rhs, (T[0], T[-1]), x, t_eval=T, **{
+                    'max_step': np.min(np.diff(T)), **solve_ivp_kwargs})
+            if not soln.success:
+                raise RuntimeError("solve_ivp failed: " + soln.message)
+            states = soln.y
+        else:
+            states = x[:, None]
+
+        # Outputs for this window (the last sample belongs to the next one)
+        v, xc = states[:, :stop - start]
+        yield start, np.stack([v, Cc * xc + Dc * (vref[:v.size] - v)], axis=1)
+
+        x = states[:, -1]
+        start = stop
+
+
+def simulate_cycle_to_file(cycle, filename, **kwargs):
+    """Simulate a drive cycle and write the outputs to a .npy file.
+
+    The outputs are written through a memory map, one window at a time.
+    See `simulate_cycle` for the keyword arguments.
+
+    Returns
+    -------
+    array
+        Memory mapped output array, with columns [v, u].
+
+    """
+    cycle = load_cycle(cycle)
+    output = np.lib.format.open_memmap(
+        filename, mode='w+', dtype=float, shape=(cycle.shape[0], 2))
+    for start, y in simulate_cycle(cycle, **kwargs):
+        output[start:start + y.shape[0]] = y
+    output.flush()
+    return output
+
+
+def generate_cycle(filename, duration, dt=0.1, seed=0, window=100000):
+    """Generate a synthetic drive cycle.
+
+    The speed reference steps between random values every few minutes and
+    the road slope is a smoothed random process.  The cycle is written to
+    the file one window at a time.
+
+    Parameters
+    ----------
+    filename : str
+        Name of the .npy file to create.
+    duration : float
+        Length of the drive cycle, in seconds.
+    dt : float, optional
+        Sample time.
+    seed : int, optional
+        Seed for the random number generator.
+
+    """
+    import scipy.signal
+
+    rng = np.random.default_rng(seed)
+    nsamples = int(duration / dt) + 1
+    cycle = np.lib.format.open_memmap(
+        filename, mode='w+', dtype=float, shape=(nsamples, 3))
+
+    # Road slope: white noise through a first order filter (20 s)
+    a = dt / 20
+    zi = np.zeros(1)
+
+    vref, hold = 20., 0                 # current speed and samples left
+    for start in range(0, nsamples, window):
+        n = min(window, nsamples - start)
+        cycle[start:start + n, 0] = (start + np.arange(n)) * dt
+        theta, zi = scipy.signal.lfilter(
+            [a], [1, a - 1], rng.normal(0, 0.05, n), zi=zi)
+        cycle[start:start + n, 2] = theta
+
+        # Speed reference: hold a random speed for 1-5 minutes
+        speeds = np.empty(n)
+        i = 0
+        while i < n:
+            if hold == 0:
+                vref = rng.uniform(15, 30)
+                hold = int(rng.uniform(60, 300) / dt)
+            count = min(hold, n - i)
+            speeds[i:i + count] = vref
+            hold -= count
+            i += count
+        cycle[start:start + n, 1] = speeds
+    cycle.flush()
+
+
+def main(argv=None):
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(
+        description="Simulate the cruise controller over a drive cycle.")
+    parser.add_argument('cycle', help="drive cycle (.npy)")
+    parser.add_argument('-o', '--output', help="output file (.npy)")
+    parser.add_argument('--window', type=int, default=10000,
+                        help="samples per window (default: %(default)s)")
+    parser.add_argument('--generate', type=float, metavar='HOURS',
+                        help="generate a synthetic drive cycle")
+    args = parser.parse_args(argv)
+
+    if args.generate:
+        generate_cycle(args.cycle, args.generate * 3600)
+        return
+
+    cycle = load_cycle(args.cycle)
+    output = None if args.output is None else np.lib.format.open_memmap(
+        args.output, mode='w+', dtype=float, shape=(cycle.shape[0], 2))
+
+    start = time.perf_counter()
+    max_error = 0.
+    for index, y in simulate_cycle(cycle, window=args.window):
+        if output is not None:
+            output[index:index + y.shape[0]] = y
+        max_error = max(max_error, np.max(np.abs(
+            cycle[index:index + y.shape[0], 1] - y[:, 0])))
+    if output is not None:
+        output.flush()
+
+    print("Simulated %d samples in %.1f s, max velocity error %.2f m/s" % (
+        cycle.shape[0], time.perf_counter() - start, max_error))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,360 @@
+# cruise_fleet.py - Monte Carlo robustness analysis for cruise control
+#
+# Figure 1.11 shows the response of the cruise controller to a hill for
+# three different vehicle masses.  This module carries out the same
+# analysis over a large number of randomly sampled vehicles (mass, drag,
+# rolling friction, gear and hill profile) to check the robustness of the
+# PI controller in cruise.py across a fleet of vehicles.
+#
+# The samples are split into shards that are simulated in parallel on a
+# process pool.  Each shard simulates its vehicles in chunks using
+# cruise.cruise_PI_ensemble() and only keeps summary statistics (histograms
+# of the velocity error at each time, peak throttle and settling time),
+# which are merged as the shards complete.  Memory use is therefore
+# independent of the number of samples.
+#
+# Usage:
+#   python cruise_fleet.py [-n NSAMPLES] [-j JOBS] [--seed SEED]
+#                          [--output FILE]
+
+import itertools
+import os
+
+import numpy as np
+
+import cruise
+
+# Time points and reference speed (same as figure 1.11)
+default_timepts = np.linspace(0, 25, 101)
+default_vref = 20.
+
+# Ranges for the sampled parameters
+sample_ranges = {
+    'm': (1000., 2500.),                # vehicle mass, kg
+    'Cd': (0.28, 0.36),                 # drag coefficient
+    'Cr': (0.007, 0.015),               # coefficient of rolling friction
+    'gear': (3, 4, 5),                  # gear (chosen uniformly)
+    'slope': (0., 5./180. * np.pi),     # final slope of the hill, rad
+    'start': (2., 8.),                  # time at which the hill starts, s
+}
+
+# Bins used for the velocity error, peak throttle and settling time.  The
+# throttle bins cover the throttle range of the vehicle model ([0, 1], see
+# cruise.vehicle_update); vehicles with larger commands are counted as
+# saturated instead of being included in the throttle histogram.
+error_bins = np.linspace(-2, 10, 601)
+throttle_bins = np.linspace(0, 1, 401)
+settling_bins = np.linspace(0, 25, 251)
+
+
+class FleetStatistics:
+    """Summary statistics for the response of a fleet of vehicles.
+
+    The statistics are stored as histograms, so that the statistics for
+    different sets of vehicles can be combined using `merge`.
+
+    Attributes
+    ----------
+    timepts : array
+        Time points for the response.
+    count : int
+        Number of vehicles.
+    error_min, error_max : array
+        Minimum and maximum velocity error (vref - v) at each time.
+    error_hist : array
+        Histogram of the velocity error at each time, with shape
+        (len(timepts), len(error_bins) + 1).  The first and last columns
+        count the values below and above the range of the bins.
+    throttle_hist, settling_hist : array
+        Histograms of the peak throttle (for vehicles that did not saturate)
+        and the settling time (for vehicles that settled).
+    saturated : int
+        Number of vehicles whose throttle command exceeded full throttle.
+    unsettled : int
+        Number of vehicles that did not settle by the end of the simulation.
+
+    """
+    def __init__(self, timepts=default_timepts, tolerance=0.1):
+        self.timepts = np.asarray(timepts)
+        self.tolerance = tolerance
+        self.count = 0
+        self.error_min = np.full(self.timepts.size, np.inf)
+        self.error_max = np.full(self.timepts.size, -np.inf)
+        self.error_hist = np.zeros(
+            (self.timepts.size, error_bins.size + 1), dtype=int)
+        self.throttle_hist = np.zeros(throttle_bins.size + 1, dtype=int)
+        self.settling_hist = np.zeros(settling_bins.size + 1, dtype=int)
+        self.saturated = 0
+        self.unsettled = 0
+
+    def update(self, error, throttle, start):
+        """Add the responses of a set of vehicles.
+
+        Parameters
+        ----------
+        error, throttle : array
+            Velocity error and throttle command, with shape (N, len(timepts)).
+        start : array
+            Time at which the disturbance starts for each vehicle (used to
+            compute the settling time).
+
+        """
+        nvehicles, ntimes = error.shape
+        self.count += nvehicles
+        self.error_min = np.minimum(self.error_min, error.min(axis=0))
+        self.error_max = np.maximum(self.error_max, error.max(axis=0))
+
+        # Histogram of the errors at each time point
+        bins = np.searchsorted(error_bins, error) + \
+            np.arange(ntimes) * (error_bins.size + 1)
+        self.error_hist += np.bincount(
+            bins.ravel(), minlength=self.error_hist.size).reshape(
+                self.error_hist.shape)
+
+        # Peak throttle (the histogram only includes the vehicles that do
+        # not saturate, so that the percentiles are not stuck at full
+        # throttle)
+        peak = throttle.max(axis=1)
+        saturated = peak > throttle_bins[-1]
+        self.saturated += np.count_nonzero(saturated)
+        self.throttle_hist += np.bincount(
+            np.searchsorted(throttle_bins, peak[~saturated]),
+            minlength=self.throttle_hist.size)
+
+        # Settling time: time from the start of the disturbance until the
+        # error stays within the tolerance
+        outside = np.abs(error) > self.tolerance
+        last = ntimes - 1 - np.argmax(outside[:, ::-1], axis=1)
+        settled = ~outside[:, -1]
+        settling = np.where(
+            outside.any(axis=1),
+            self.timepts[np.minimum(last + 1, ntimes - 1)] - start, 0.)
+        self.unsettled += np.count_nonzero(~settled)
+        self.settling_hist += np.bincount(
+            np.searchsorted(settling_bins, np.maximum(settling[settled], 0)),
+            minlength=self.settling_hist.size)
+
+    def merge(self, other):
+        """Add the statistics for another set of vehicles."""
+        if not np.array_equal(self.timepts, other.timepts):
+            raise ValueError("statistics use different time points")
+        self.count += other.count
+        self.error_min = np.minimum(self.error_min, other.error_min)
+        self.error_max = np.maximum(self.error_max, other.error_max)
+        self.error_hist += other.error_hist
+        self.throttle_hist += other.throttle_hist
+        self.settling_hist += other.settling_hist
+        self.saturated += other.saturated
+        self.unsettled += other.unsettled
+        return self
+
+    def error_percentile(self, q):
+        """Percentile of the velocity error at each time (from histograms).
+
+        The result is accurate to the width of the error bins.
+
+        """
+        return _hist_percentile(self.error_hist, error_bins, q)
+
+    def summary(self):
+        """Return a dictionary summarizing the statistics."""
+        settled = self.count - self.unsettled
+        unsaturated = self.count - self.saturated
+        return {
+            'vehicles': self.count,
+            'max_error': float(self.error_max.max()),
+            'min_error': float(self.error_min.min()),
+            'error_p99': float(self.error_percentile(99).max()),
+            'peak_throttle_p50': float(_hist_percentile(
+                self.throttle_hist, throttle_bins, 50))
+                if unsaturated else None,
+            'peak_throttle_p99': float(_hist_percentile(
+                self.throttle_hist, throttle_bins, 99))
+                if unsaturated else None,
+            'saturated': self.saturated,
+            'saturated_fraction':
+                self.saturated / self.count if self.count else 0.,
+            'settling_time_p50': float(_hist_percentile(
+                self.settling_hist, settling_bins, 50)) if settled else None,
+            'settling_time_p99': float(_hist_percentile(
+                self.settling_hist, settling_bins, 99)) if settled else None,
+            'unsettled': self.unsettled,
+        }
+
+    def save(self, filename):
+        """Save the statistics to a .npz file."""
+        np.savez_compressed(
+            filename, timepts=self.timepts, tolerance=self.tolerance,
+            count=self.count, error_min=self.error_min,
+            error_max=self.error_max, error_hist=self.error_hist,
+            error_bins=error_bins, throttle_hist=self.throttle_hist,
+            throttle_bins=throttle_bins, settling_hist=self.settling_hist,
+            settling_bins=settling_bins, saturated=self.saturated,
+            unsettled=self.unsettled)
+
+
+# Percentile of histogrammed data (along the last axis), using the upper
+# edge of the bin containing the percentile
+def _hist_percentile(hist, edges, q):
+    cumulative = np.cumsum(hist, axis=-1)
+    target = q / 100 * cumulative[..., -1:]
+    index = np.argmax(cumulative >= np.maximum(target, 1), axis=-1)
+    values = edges[np.clip(index, 0, edges.size - 1)]
+    return values if np.ndim(values) else values[()]
+
+
+def sample_vehicles(rng, nsamples):
+    """Sample vehicle parameters and hill profiles.
+
+    Parameters
+    ----------
+    rng : numpy.random.Generator
+        Random number generator.
+    nsamples : int
+        Number of vehicles.
+
+    Returns
+    -------
+    params : dict
+        Vehicle parameters, as arrays of length `nsamples`.
+    hills : dict
+        Final slope ('slope') and start time ('start') of the hill for
+        each vehicle.
+
+    """
+    uniform = lambda key: rng.uniform(*sample_ranges[key], nsamples)
+    params = {key: uniform(key) for key in ['m', 'Cd', 'Cr']}
+    params['gear'] = rng.choice(sample_ranges['gear'], nsamples)
+    hills = {key: uniform(key) for key in ['slope', 'start']}
+    return params, hills
+
+
+def simulate_shard(seed, nsamples, timepts=default_timepts,
+                   vref=default_vref, chunk=1000, tolerance=0.1):
+    """Simulate a shard of the fleet and return its statistics.
+
+    Parameters
+    ----------
+    seed : numpy.random.SeedSequence or int
+        Seed for the samples in this shard.
+    nsamples : int
+        Number of vehicles in the shard.
+    timepts : array, optional
+        Time points for the simulation.
+    vref : float, optional
+        Reference speed.
+    chunk : int, optional
+        Number of vehicles to simulate together.
+    tolerance : float, optional
+        Velocity error used to define the settling time.
+
+    Returns
+    -------
+    FleetStatistics
+
+    """
+    rng = np.random.default_rng(seed)
+    stats = FleetStatistics(timepts, tolerance)
+    for start in range(0, nsamples, chunk):
+        params, hills = sample_vehicles(rng, min(chunk, nsamples - start))
+        gear = params.pop('gear')
+
+        # Hill profile: ramp up to the final slope over one second
+        theta = np.clip(
+            timepts - hills['start'][:, None], 0, 1) * hills['slope'][:, None]
+        U = np.broadcast_arrays(vref, gear[:, None], theta)
+
+        _, y = cruise.cruise_PI_ensemble(timepts, U, params)
+        stats.update(vref - y[0], y[1], hills['start'])
+    return stats
+
+
+def run_fleet(nsamples, jobs=None, shard_size=10000, seed=0, **kwargs):
+    """Simulate a fleet of vehicles on a process pool.
+
+    Parameters
+    ----------
+    nsamples : int
+        Number of vehicles.
+    jobs : int, optional
+        Number of worker processes (default: number of cores).
+    shard_size : int, optional
+        Number of vehicles per shard.
+    seed : int, optional
+        Seed for the random samples.  The results do not depend on the
+        number of worker processes.
+    **kwargs
+        Additional arguments passed to `simulate_shard`.
+
+    Yields
+    ------
+    FleetStatistics
+        Combined statistics for the shards completed so far (the final
+        value contains the statistics for the whole fleet).
+
+    """
+    from concurrent.futures import ProcessPoolExecutor, wait, \
+        FIRST_COMPLETED
+
+    jobs = jobs or os.cpu_count()
+    shards = _shards(nsamples, shard_size, seed)
+    stats = FleetStatistics(
+        kwargs.get('timepts', default_timepts), kwargs.get('tolerance', 0.1))
+
+    # Keep at most two shards per worker in flight, so that the results of
+    # completed shards are released as soon as they have been merged
+    with ProcessPoolExecutor(jobs) as executor:
+        pending = set()
+        while True:
+            for seed, size in itertools.islice(
+                    shards, 2 * jobs - len(pending)):
+                pending.add(
+                    executor.submit(simulate_shard, seed, size, **kwargs))
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield stats.merge(future.result())
+
+
+# Generate the seeds and sizes of the shards
+def _shards(nsamples, shard_size, seed):
+    sequence = np.random.SeedSequence(seed)
+    for start in range(0, nsamples, shard_size):
+        yield sequence.spawn(1)[0], min(shard_size, nsamples - start)
+
+
+def main(argv=None):
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(
+        description="Monte Carlo robustness analysis for cruise control.")
+    parser.add_argument('-n', '--nsamples', type=int, default=100000,
+                        help="number of vehicles (default: %(default)s)")
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help="number of worker processes")
+    parser.add_argument('--shard-size', type=int, default=10000,
+                        help="vehicles per shard (default: %(default)s)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="save the statistics (.npz)")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    stats = FleetStatistics()
+    for stats in run_fleet(
+            args.nsamples, args.jobs, args.shard_size, args.seed):
+        print("%d/%d vehicles (%.1f s)" % (
+            stats.count, args.nsamples, time.perf_counter() - start))
+
+    if stats.count == 0:
+        print("No vehicles to simulate")
+        return
+    for key, value in stats.summary().items():
+        print("  %-18s %s" % (key, value))
+    if args.output:
+        stats.save(args.output)
+
+
+if __name__ == '__main__':
+    main()
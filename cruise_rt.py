@@ -0,0 +1,204 @@
+# cruise_rt.py - fixed-rate loop runner for the cruise controller
+#
+# This module checks whether a Python implementation of the cruise
+# controller in cruise.py can meet a fixed sample rate (1 kHz by default).
+# The PI controller is discretized at the sample rate and run in a loop
+# against a local simulation of the vehicle dynamics, which stands in for
+# the real vehicle.  Each iteration waits for its scheduled start time and
+# then computes the control action and advances the vehicle model by one
+# sample.  The runner records the compute latency of each iteration, the
+# deviation of its start time from the schedule (jitter) and the number of
+# iterations that missed their deadline (the start of the next iteration).
+#
+# The loop body works with preallocated buffers and Python floats, so that
+# there is no per-step array allocation, and garbage collection is disabled
+# while the loop runs.
+#
+# Usage:
+#   python cruise_rt.py [--rate HZ] [--duration SECONDS]
+
+import gc
+import time
+
+import numpy as np
+import control as ct
+
+import cruise
+
+
+def discretize_controller(dt, method='tustin'):
+    """Discretize the cruise PI controller.
+
+    Parameters
+    ----------
+    dt : float
+        Sample time.
+    method : str, optional
+        Discretization method (passed to ct.c2d).
+
+    Returns
+    -------
+    a, b, c, d : float
+        Coefficients of the controller x[k+1] = a x[k] + b e[k], u[k] =
+        c x[k] + d e[k], where e = vref - v.
+
+    """
+    sys = ct.c2d(ct.ss(cruise.PI_control), dt, method=method)
+    return tuple(float(M[0, 0]) for M in (sys.A, sys.B, sys.C, sys.D))
+
+
+def run_loop(rate=1000., duration=5., vref=20., gear=4, theta=None,
+             params={}, spin=2e-4):
+    """Run the cruise controller at a fixed rate.
+
+    Parameters
+    ----------
+    rate : float, optional
+        Sample rate, in Hz.
+    duration : float, optional
+        Length of the run, in seconds of wall clock time.
+    vref : float, optional
+        Reference speed.
+    gear : int, optional
+        Gear.
+    theta : callable, optional
+        Road slope as a function of time (default: 4 degree hill starting
+        at 1 second, as in figure 1.11).
+    params : dict, optional
+        Vehicle parameters (see `cruise.vehicle_update`).
+    spin : float, optional
+        Time before the next deadline below which the loop busy-waits
+        instead of sleeping (the resolution of time.sleep is limited).
+
+    Returns
+    -------
+    dict
+        Per-iteration arrays 'latency' and 'jitter' (in seconds), the
+        vehicle velocity 'v' and throttle 'u', the number of deadline
+        'misses' and the loop parameters.
+
+    """
+    dt = 1 / rate
+    niter = int(duration * rate)
+    a, b, c, d = discretize_controller(dt)
+    update = cruise.create_vehicle_update(params)
+    if theta is None:
+        theta = lambda t: np.clip(4/180 * np.pi * (t - 1), 0, 4/180 * np.pi)
+
+    # Preallocated buffers
+    latency = np.zeros(niter)
+    jitter = np.zeros(niter)
+    velocity = np.zeros(niter)
+    throttle = np.zeros(niter)
+    slope = [float(theta(k * dt)) for k in range(niter)]
+    x, u = [vref], [0., gear, 0.]       # vehicle state and input
+
+    # Start with the throttle that holds the speed on the initial slope
+    _, throttle0 = cruise.cruise_PI_equilibrium(vref, gear, slope[0], params)
+    xc = float(throttle0[0]) / c
+    misses = 0
+
+    period = int(dt * 1e9)
+    spin_ns = int(spin * 1e9)
+    perf_counter_ns, sleep = time.perf_counter_ns, time.sleep
+
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        start = perf_counter_ns() + period
+        for k in range(niter):
+            # Wait for the scheduled start of this iteration
+            scheduled = start + k * period
+            remaining = scheduled - perf_counter_ns()
+            if remaining > spin_ns:
+                sleep((remaining - spin_ns) * 1e-9)
+            while perf_counter_ns() < scheduled:
+                pass
+            begin = perf_counter_ns()
+
+            # Controller
+            e = vref - x[0]
+            u[0] = c * xc + d * e
+            xc = a * xc + b * e
+
+            # Vehicle (forward Euler step)
+            u[2] = slope[k]
+            x[0] += dt * update(k * dt, x, u)
+
+            end = perf_counter_ns()
+            latency[k] = (end - begin) * 1e-9
+            jitter[k] = (begin - scheduled) * 1e-9
+            velocity[k] = x[0]
+            throttle[k] = u[0]
+            if end > scheduled + period:
+                misses += 1
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+    return {
+        'rate': rate, 'iterations': niter, 'misses': misses,
+        'latency': latency, 'jitter': jitter, 'v': velocity, 'u': throttle}
+
+
+def histogram(samples, bins=None):
+    """Histogram of latency or jitter samples on log spaced bins.
+
+    Returns
+    -------
+    counts : array
+        Number of samples in each bin.
+    edges : array
+        Bin edges, in seconds (default: 0.1 us to 100 ms).
+
+    """
+    edges = np.logspace(-7, -1, 31) if bins is None else bins
+    counts, _ = np.histogram(np.clip(samples, edges[0], edges[-1]), edges)
+    return counts, edges
+
+
+def summary(results):
+    """Summarize the results of `run_loop`."""
+    stats = {'iterations': results['iterations'], 'misses': results['misses']}
+    for key in ['latency', 'jitter']:
+        samples = results[key]
+        stats[key] = {
+            'p50': float(np.percentile(samples, 50)),
+            'p99': float(np.percentile(samples, 99)),
+            'max': float(np.max(samples))}
+    return stats
+
+
+def print_summary(results):
+    stats = summary(results)
+    print("%d iterations at %g Hz, %d deadline misses (%.2f%%)" % (
+        stats['iterations'], results['rate'], stats['misses'],
+        100 * stats['misses'] / stats['iterations']))
+    for key in ['latency', 'jitter']:
+        print("  %-8s p50 %8.1f us  p99 %8.1f us  max %8.1f us" % (
+            key, *(1e6 * stats[key][q] for q in ['p50', 'p99', 'max'])))
+        counts, edges = histogram(results[key])
+        for count, low, high in zip(counts, edges[:-1], edges[1:]):
+            if count:
+                print("    %9.1f - %9.1f us: %d" % (1e6 * low, 1e6 * high,
+                                                   count))
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="Run the cruise controller at a fixed rate.")
+    parser.add_argument('--rate', type=float, default=1000.,
+                        help="sample rate in Hz (default: %(default)s)")
+    parser.add_argument('--duration', type=float, default=5.,
+                        help="length of the run in s (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    results = run_loop(args.rate, args.duration)
+    print_summary(results)
+    print("Final velocity %.3f m/s, throttle %.3f" % (
+        results['v'][-1], results['u'][-1]))
+
+
+if __name__ == '__main__':
+    main()
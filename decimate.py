@@ -0,0 +1,129 @@
+# decimate.py - shape-preserving downsampling of dense plot data
+#
+# Several figures plot many more points than can be resolved at the size
+# of the figures in the text (3.4 in wide).  The functions in this module
+# reduce a series to a number of points comparable to the pixel width of
+# the axes using the largest-triangle-three-buckets (LTTB) algorithm, with
+# a min/max preselection step so that peaks and valleys are kept (this
+# combination is sometimes called MinMaxLTTB).  The fbs.plot() function
+# uses this module to decimate data before plotting.
+#
+# This module has no side effects on import, so it can also be used from
+# scripts that use ct.use_fbs_defaults() instead of fbs.
+
+import numpy as np
+
+
+def _minmax_indices(y, nbuckets):
+    # Indices of the min and max of y in each of nbuckets (interior) buckets
+    n = y.size - 2
+    size = n // nbuckets
+    if size < 2:
+        return np.arange(1, y.size - 1)
+    interior = y[1:1 + size * nbuckets].reshape(nbuckets, size)
+    offsets = 1 + size * np.arange(nbuckets)
+    indices = np.concatenate([
+        offsets + np.argmin(interior, axis=1),
+        offsets + np.argmax(interior, axis=1),
+        np.arange(1 + size * nbuckets, y.size - 1)])   # leftover points
+    return np.unique(indices)
+
+
+def lttb_indices(x, y, npoints, minmax_ratio=4):
+    """Indices of the points to keep when downsampling a series.
+
+    Parameters
+    ----------
+    x, y : 1D array
+        Data to be downsampled.  The `x` values should be monotonic.
+    npoints : int
+        Number of points to keep (including the first and last points).
+    minmax_ratio : int, optional
+        Number of candidate points per output point kept by the min/max
+        preselection step (0 to disable preselection).
+
+    Returns
+    -------
+    indices : 1D array of int
+        Sorted indices of the points to keep.
+
+    """
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    if npoints >= x.size or npoints < 3:
+        return np.arange(x.size)
+
+    # Preselect the local minima and maxima to reduce the work for LTTB
+    if minmax_ratio and x.size > npoints * minmax_ratio:
+        candidates = np.concatenate([
+            [0], _minmax_indices(y, npoints * minmax_ratio // 2),
+            [x.size - 1]])
+    else:
+        candidates = np.arange(x.size)
+    if candidates.size <= npoints:
+        return candidates
+    xc, yc = x[candidates], y[candidates]
+
+    # Split the interior points into buckets, one per output point
+    edges = np.linspace(1, xc.size - 1, npoints - 1).astype(int)
+    keep = np.empty(npoints, dtype=int)
+    keep[0], keep[-1] = 0, xc.size - 1
+
+    # Choose the point in each bucket that makes the largest triangle with
+    # the previous point and the average of the next bucket
+    for i in range(npoints - 2):
+        start, stop = edges[i], edges[i + 1]
+        if i + 2 < npoints - 1:
+            xn = xc[stop:edges[i + 2]].mean()
+            yn = yc[stop:edges[i + 2]].mean()
+        else:
+            xn, yn = xc[-1], yc[-1]
+        xp, yp = xc[keep[i]], yc[keep[i]]
+        area = np.abs(
+            (xp - xn) * (yc[start:stop] - yp) -
+            (xp - xc[start:stop]) * (yn - yp))
+        keep[i + 1] = start + np.argmax(area)
+
+    return candidates[keep]
+
+
+def decimate(
+        x, y, npoints, minmax_ratio=4, xscale='linear', yscale='linear'):
+    """Downsample a series for plotting.
+
+    Returns the original data if it contains non-finite values (which
+    matplotlib uses to break lines) or if `x` is not monotonic.  See
+    `lttb_indices` for a description of the parameters.  If `xscale` or
+    `yscale` is 'log', the points are selected based on the logarithm of
+    the data, so that the shape is preserved on log axes.
+
+    Returns
+    -------
+    x, y : 1D array
+        Downsampled data.
+
+    """
+    x, y = np.asarray(x), np.asarray(y)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        xs = np.log10(x) if xscale == 'log' else x
+        ys = np.log10(y) if yscale == 'log' else y
+    if not should_decimate(xs, ys, npoints):
+        return x, y
+    indices = lttb_indices(xs, ys, npoints, minmax_ratio)
+    return x[indices], y[indices]
+
+
+# Check whether a series can be downsampled
+def should_decimate(x, y, npoints):
+    if x.ndim != 1 or y.shape != x.shape or x.size <= npoints:
+        return False
+    if not (np.all(np.isfinite(x)) and np.all(np.isfinite(y))):
+        return False
+    dx = np.diff(x)
+    return bool(np.all(dx >= 0) or np.all(dx <= 0))
+
+
+# Number of points to use for a given axes (two per horizontal pixel)
+def pixel_points(ax, dpi=None):
+    fig = ax.get_figure()
+    width = ax.get_position().width * fig.get_figwidth()
+    return max(int(2 * width * (dpi or fig.dpi)), 3)
@@ -0,0 +1,162 @@
+# eigtrack.py - eigenvalue continuation for parameterized systems
+#
+# Root locus style plots show how the eigenvalues of a matrix A(p) change
+# as a parameter p is varied.  Sorting the eigenvalues at each point on a
+# uniform grid does not give consistent branches: the order changes when
+# eigenvalues move past each other or turn from real to complex, and a
+# uniform grid wastes points where the branches are nearly straight while
+# missing detail where they bend.
+#
+# The track() function in this module follows each eigenvalue as the
+# parameter changes.  At each step the new eigenvalues are matched to a
+# prediction from the previous points (by minimizing the total distance
+# with scipy.optimize.linear_sum_assignment), and the step size is adapted
+# so that the branches deviate from the prediction by no more than a given
+# tolerance.  Points at which a branch crosses the imaginary axis are
+# located by bisection and included in the result.
+#
+# Example:
+#
+#   from bicycle import whipple_A
+#   branches = track(whipple_A, 0, 15)
+#   branches.pole_zero_data().plot()
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+
+class EigenvalueBranches:
+    """Eigenvalue branches computed by `track`.
+
+    Attributes
+    ----------
+    params : array
+        Parameter values, in order along the path.
+    loci : array
+        Eigenvalues at each parameter value, with shape (len(params), n).
+        Column j follows a single eigenvalue branch.
+    crossings : list of (float, int, complex)
+        Parameter value, branch index and eigenvalue for each point at
+        which a branch crosses the imaginary axis.
+
+    """
+    def __init__(self, params, loci, crossings):
+        self.params = np.asarray(params)
+        self.loci = np.asarray(loci)
+        self.crossings = crossings
+
+    def stable(self):
+        """Boolean array indicating where all eigenvalues have Re < 0."""
+        return np.all(self.loci.real < 0, axis=1)
+
+    def pole_zero_data(self, sysname=None):
+        """Return the branches as a root locus (ct.PoleZeroData)."""
+        import control as ct
+        return ct.PoleZeroData(
+            self.loci[0], [], self.params, self.loci, sysname=sysname)
+
+
+# Order the eigenvalues in `new` to match the predicted values
+def _match(predicted, new):
+    cost = np.abs(predicted[:, np.newaxis] - new[np.newaxis, :])
+    _, columns = linear_sum_assignment(cost)
+    return new[columns]
+
+
+def track(A, p0, p1, step=None, min_step=None, max_step=None, tol=1e-2,
+          xtol=1e-12):
+    """Track the eigenvalues of a parameterized matrix.
+
+    Parameters
+    ----------
+    A : callable
+        Function returning the (square) matrix for a parameter value.
+    p0, p1 : float
+        Start and end of the parameter range (p1 < p0 is allowed).
+    step : float, optional
+        Initial step size (default: 1/100 of the range).
+    min_step, max_step : float, optional
+        Limits on the step size (default: 1e-6 and 1/10 of the range).
+    tol : float, optional
+        Allowed deviation of each eigenvalue from the linear prediction,
+        relative to max(1, |eigenvalue|).  Smaller values give more points
+        where the branches bend.
+    xtol : float, optional
+        Tolerance on the parameter value for locating crossings of the
+        imaginary axis.
+
+    Returns
+    -------
+    EigenvalueBranches
+
+    """
+    eigvals = lambda p: np.linalg.eigvals(A(p)).astype(complex)
+    span = p1 - p0
+    direction = np.sign(span)
+    step = abs(span) / 100 if step is None else abs(step)
+    min_step = 1e-6 * abs(span) if min_step is None else min_step
+    max_step = abs(span) / 10 if max_step is None else max_step
+
+    params = [p0]
+    loci = [np.sort(eigvals(p0))]
+    crossings = []
+
+    p = p0
+    while direction * (p1 - p) > 0:
+        h = min(step, abs(p1 - p))
+        p_new = p + direction * h
+        lam_new = eigvals(p_new)
+
+        # Predict the new values by linear extrapolation (or constant, for
+        # the first step) and match the new eigenvalues to the prediction
+        if len(params) > 1:
+            slope = (loci[-1] - loci[-2]) / (params[-1] - params[-2])
+            predicted = loci[-1] + slope * (p_new - p)
+        else:
+            predicted = loci[-1]
+        lam_new = _match(predicted, lam_new)
+
+        # Adapt the step size based on the prediction error
+        error = np.max(
+            np.abs(lam_new - predicted) / np.maximum(1, np.abs(lam_new)))
+        if error > tol and h > min_step:
+            step = max(h / 2, min_step)
+            continue
+        if error < tol / 4:
+            step = min(2 * h, max_step)
+
+        # Locate any crossings of the imaginary axis in this step
+        lam = loci[-1]
+        for j in np.flatnonzero(np.sign(lam.real) * np.sign(lam_new.real) < 0):
+            p_cross, lam_cross = _bisect_crossing(
+                eigvals, j, p, lam, p_new, lam_new, xtol)
+            crossings.append((float(p_cross), int(j), complex(lam_cross[j])))
+            if p_cross not in params:   # complex pairs cross together
+                params.append(p_cross)
+                loci.append(lam_cross)
+
+        params.append(p_new)
+        loci.append(lam_new)
+        p = p_new
+
+    # Sort the crossing points into place along the path
+    order = np.argsort(direction * np.asarray(params), kind='stable')
+    crossings.sort(key=lambda crossing: direction * crossing[0])
+    return EigenvalueBranches(
+        np.asarray(params)[order], np.asarray(loci)[order], crossings)
+
+
+# Find the parameter value at which branch j crosses the imaginary axis
+def _bisect_crossing(eigvals, j, pa, lam_a, pb, lam_b, xtol):
+    sign_a = np.sign(lam_a[j].real)
+    while abs(pb - pa) > xtol * max(1, abs(pa)):
+        pm = (pa + pb) / 2
+        lam_m = _match((lam_a + lam_b) / 2, eigvals(pm))
+        if np.sign(lam_m[j].real) == sign_a:
+            pa, lam_a = pm, lam_m
+        else:
+            pb, lam_b = pm, lam_m
+        if lam_m[j].real == 0:
+            break
+    return (pa, lam_a) if abs(lam_a[j].real) <= abs(lam_b[j].real) else \
+        (pb, lam_b)
@@ -15,6 +15,7 @@ import control as ct
 import numpy as np
 import scipy
 import matplotlib.pyplot as plt
+import golden                   # golden data regression checks
 ct.use_fbs_defaults()
 
 #
@@ -72,6 +73,9 @@ for a in avals:
     else:
         cvals_upper.append(np.nan)
 
+golden.register('cvals_lower', cvals_lower)
+golden.register('cvals_upper', cvals_upper)
+
 ax.plot(avals, cvals_lower, 'k', linewidth=0.5)
 ax.plot(avals, cvals_upper, 'k', linewidth=0.5)
 ax.fill_between(avals, cvals_lower, cvals_upper, color='0.9')
@@ -128,6 +132,11 @@ for a in avals:
         lower_H.append(np.min(resp.outputs[0, -500:]))
         upper_H.append(np.max(resp.outputs[0, -500:]))
 
+golden.register('stable_H', stable_H)
+golden.register('unstable_H', unstable_H)
+golden.register('lower_H', lower_H, rtol=1e-4)
+golden.register('upper_H', upper_H, rtol=1e-4)
+
 # Plot the different branches
 ax.plot(avals, stable_H, 'b-')
 ax.plot(avals, unstable_H, 'r--')
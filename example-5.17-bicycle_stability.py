@@ -22,13 +22,15 @@ import control as ct
 import numpy as np
 import matplotlib.pyplot as plt
 from math import isclose
+import golden                   # golden data regression checks
 ct.use_fbs_defaults()
 
 #
 # System dynamics
 #
 
-from bicycle import whipple_A
+from bicycle import whipple_A, whipple_eigvals, whipple_critical_speeds
+from eigtrack import track
 
 # Set up the plotting grid to match the layout in the book
 fig = plt.figure(constrained_layout=True)
@@ -43,10 +45,9 @@ ax.set_title("(a) Stability diagram")
 
 # Compute the eigenvalues as a function of velocity
 v0_vals = np.linspace(-15, 15, 500)
-eig_vals = []
-for v0 in v0_vals:
-    A = whipple_A(v0)
-    eig_vals.append(np.sort(np.linalg.eig(A).eigenvalues))
+eig_vals = whipple_eigvals(v0_vals)
+
+golden.register('eig_vals', eig_vals, rtol=1e-8)
 
 # Initialize lists to categorize eigenvalues
 eigs_real_stable = []
@@ -54,11 +55,8 @@ eigs_complex_stable = []
 eigs_real_unstable = []
 eigs_complex_unstable = []
 
-# Keep track of region in which all eigenvalues are stable
-stable_beg = stable_end = None
-
 # Process each set of eigenvalues
-for i, eig_set in enumerate(eig_vals):
+for eig_set in eig_vals:
     # Create arrays filled with NaN for each category
     real_stable = np.full(eig_set.shape, np.nan)
     complex_stable = np.full(eig_set.shape, np.nan)
@@ -84,12 +82,6 @@ for i, eig_set in enumerate(eig_vals):
     eigs_real_unstable.append(real_unstable)
     eigs_complex_unstable.append(complex_unstable)
 
-    # Look for regions where everything is stable
-    if stable_beg is None and all(eig_set.real < 0):
-        stable_beg = i
-    elif stable_beg and stable_end is None and any(eig_set.real > 0):
-        stable_end = i
-
 # Plot the stability diagram
 ax.plot(v0_vals, eigs_real_stable, 'b-')
 ax.plot(v0_vals, eigs_real_unstable, 'r-')
@@ -100,11 +92,11 @@ ax.plot(v0_vals, eigs_complex_unstable, 'r--')
 ax.axhline(color='k', linewidth=0.5)
 ax.axvline(color='k', linewidth=0.5)
 
-# Label and shade stable and unstable regions
+# Label and shade stable and unstable regions (between the weave and
+# capsize speeds)
+v_weave, v_capsize = whipple_critical_speeds()
 ax.text(-12, 8, "Unstable")
-ax.fill_betweenx(
-    [-15, 15], [v0_vals[stable_beg], v0_vals[stable_beg]],
-    [v0_vals[stable_end], v0_vals[stable_end]], color='0.9')
+ax.fill_betweenx([-15, 15], v_weave, v_capsize, color='0.9')
 ax.text(7.2, 6, "Stable", rotation=90)
 ax.text(11.7, 5, "Unstable", rotation=90)
 
@@ -121,11 +113,10 @@ ax.axis([-15, 15, -15, 15])
 ax = fig.add_subplot(gs[0, 1])  # first row, second column
 ax.set_title("(b) Root locus diagram")
 
-# Generate the root locus diagram via the root_locus_plot functionality
-pos_idx = np.argmax(v0_vals >= 0)
-poles = eig_vals[pos_idx]
-loci = np.array(eig_vals[pos_idx:])
-rl_map = ct.PoleZeroData(poles, [], v0_vals[pos_idx:], loci)
+# Generate the root locus diagram by tracking the eigenvalue branches for
+# positive velocities (with more points where the branches bend)
+branches = track(whipple_A, 0, 15)
+rl_map = branches.pole_zero_data()
 rl_map.plot(ax=ax)
 
 # Add in the coordinate axes
@@ -136,12 +127,11 @@ ax.axvline(color='k', linewidth=0.5)
 ax.text(-12.5, -2, r"$\leftarrow v_0$")
 ax.text(-3.5, -2, r"$v_0 \rightarrow$")
 
-# Label the crossover points
-xo_idx = np.argmax(rl_map.loci[:, 3].real < 0)
-ax.plot(0, rl_map.loci[xo_idx, 2].imag, 'bo', markersize=3)
-ax.plot(0, rl_map.loci[xo_idx, 3].imag, 'bo', markersize=3)
-ax.text(1, rl_map.loci[xo_idx, 2].imag, r"$v_0 = 6.1$")
-ax.text(1, rl_map.loci[xo_idx, 3].imag, r"$v_0 = 6.1$")
+# Label the crossover points for the complex (weave) eigenvalues
+for v0, _, eig in branches.crossings:
+    if not isclose(eig.imag, 0):
+        ax.plot(0, eig.imag, 'bo', markersize=3)
+        ax.text(1, eig.imag, r"$v_0 = %.1f$" % v0)
 
 # Label the axes
 ax.set_xlabel(r"$\text{Re}\,\lambda$")
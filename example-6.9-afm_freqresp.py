@@ -14,6 +14,7 @@ import control as ct
 import numpy as np
 import matplotlib.pyplot as plt
 from math import sqrt
+from decimate import lttb_indices
 ct.use_fbs_defaults()
 
 #
@@ -57,8 +58,14 @@ omega = np.logspace(4, 7, 10000)  # Frequency range from 10^4 to 10^7 rad/s
 freqresp = ct.frequency_response(sys, omega)
 mag, phase = freqresp.magnitude, freqresp.phase
 
-# Create the Bode plot
-cplt = freqresp.plot()
+# Create the Bode plot, using only as many frequencies as can be resolved
+# in the figure (the full response is used below to locate the peaks)
+figwidth, dpi = plt.rcParams['figure.figsize'][0], plt.rcParams['figure.dpi']
+npoints = int(2 * figwidth * dpi)       # two points per pixel
+plot_idx = np.union1d(
+    lttb_indices(np.log10(omega), np.log10(mag), npoints),
+    lttb_indices(np.log10(omega), phase, npoints))
+cplt = ct.frequency_response(sys, omega[plot_idx]).plot()
 mag_ax, phase_ax = cplt.axes[:, 0]
 cplt.set_plot_title("(b) Frequency response")
 
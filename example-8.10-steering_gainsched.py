@@ -174,5 +174,6 @@ plt.legend((v_line, y_line), (r'$\dot x$', '$y$'),
            loc='center right', frameon=False)
 
 # Save the figure
-fbs.savefig('figure-8.13-steering_gainsched.png')       # PNG for web
-fbs.savefig('steering-gainsched.eps')                   # EPS for book
+fbs.savefig([
+    'figure-8.13-steering_gainsched.png',               # PNG for web
+    'steering-gainsched.eps'])                          # EPS for book
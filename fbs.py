@@ -1,29 +1,173 @@
 # fbs.py - FBS customization
 # RMM, 8 Oct 2021
+#
+# In addition to setting up figures to match the style of the text, this
+# module supports a compute-only ("headless") mode, selected by setting the
+# FBS_HEADLESS environment variable or calling set_headless().  In headless
+# mode the matplotlib import and font setup are deferred, figure() returns a
+# stand-in for the axes that only records the plotted lines (no matplotlib
+# figure is created), and savefig() writes the plotted data to a compressed
+# .npz file next to the intended image.
 
-import matplotlib.pyplot as plt
+import os
 
-# Set the fonts to match the main text
-plt.rc('font', family='Times New Roman', weight='normal', size=11)
-plt.rcParams['mathtext.fontset'] = 'cm'
+import numpy as np
+
+from decimate import decimate, pixel_points
+
+# Compute-only mode (no rendering)
+headless = os.environ.get('FBS_HEADLESS', '') not in ('', '0')
+
+# Figure sizes, in inches
+_figsizes = {
+    'mlf': [3.4, 5.1], '111': [3.4, 5.1],
+    'mlh': [3.4, 2.55], '221': [3.4, 2.55],
+    '211': [6.8, 2.55],
+    'mlt': [3.4, 1.7], '321': [3.4, 1.7],
+}
+
+# Additional data to save with the current figure (headless mode)
+_recorded = {}
+_axes = None
+_fonts_set = False
+
+
+# Import pyplot and set the fonts to match the main text
+def _pyplot():
+    global _fonts_set
+    import matplotlib.pyplot as plt
+    if not _fonts_set:
+        plt.rc('font', family='Times New Roman', weight='normal', size=11)
+        plt.rcParams['mathtext.fontset'] = 'cm'
+        _fonts_set = True
+    return plt
+
+
+if not headless:
+    _pyplot()
+
+
+# Turn compute-only mode on or off
+def set_headless(enable=True):
+    global headless
+    headless = enable
+    if not headless:
+        _pyplot()
+
+
+# Stand-in for the axes of a figure in headless mode.  Lines passed to
+# plot() are recorded (and saved by savefig) instead of being drawn; all
+# other axes methods (labels, limits, legends, etc) do nothing.
+class _RecordingAxes:
+    def __init__(self):
+        self.nlines = 0
+
+    def plot(self, *args, **kwargs):
+        arrays = [np.asarray(arg) for arg in args if not isinstance(arg, str)]
+        if len(arrays) % 2:
+            arrays.insert(-1, np.arange(arrays[-1].shape[0]))
+        for x, y in zip(arrays[::2], arrays[1::2]):
+            for column in y.reshape(y.shape[0], -1).T:
+                _recorded[f'line{self.nlines}_x'] = x
+                _recorded[f'line{self.nlines}_y'] = column
+                self.nlines += 1
+        return []
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return lambda *args, **kwargs: None
 
 
 # Create a new figure of a specified size
 def figure(size='mlh'):
-    if size == 'mlf' or size == '111':
-        plt.figure(figsize=[3.4, 5.1])
-    elif size == 'mlh' or size == '221':
-        plt.figure(figsize=[3.4, 2.55])
-    elif size == '211':
-        plt.figure(figsize=[6.8, 2.55])
-    elif size == 'mlt' or size == '321':
-        plt.figure(figsize=[3.4, 1.7])
-    else:
+    global _axes
+    if size not in _figsizes:
         raise ValueError("unknown figure size")
+    _recorded.clear()
+    _axes = None
+
+    if headless:
+        # Don't build a matplotlib figure; close the figures from earlier
+        # plots so that only data for this figure is saved
+        import sys
+        if 'matplotlib.pyplot' in sys.modules:
+            sys.modules['matplotlib.pyplot'].close('all')
+        _axes = _RecordingAxes()
+        return _axes
+
+    plt = _pyplot()
+    plt.figure(figsize=_figsizes[size])
     return plt.gca()
-    
+
+
+# Plot data, downsampled to the resolution of the axes
+#
+# Usage: plot(x, y, [fmt], ax=None, npoints=None, **kwargs).  Each column of
+# y is downsampled to `npoints` points (default: two per horizontal pixel)
+# using a shape-preserving method, then passed to ax.plot().  Set the axis
+# scales (e.g., ax.set_xscale('log')) before calling this function.
+def plot(x, y, *args, ax=None, npoints=None, **kwargs):
+    if ax is None:
+        ax = _axes if headless and _axes is not None else _pyplot().gca()
+    if isinstance(ax, _RecordingAxes):
+        return ax.plot(x, y)            # save the full data (headless mode)
+    if npoints is None:
+        npoints = pixel_points(ax)
+
+    x, y = np.asarray(x), np.asarray(y)
+    scales = {'xscale': ax.get_xscale(), 'yscale': ax.get_yscale()}
+    if y.ndim == 1:
+        return ax.plot(*decimate(x, y, npoints, **scales), *args, **kwargs)
+
+    lines = []
+    for column in y.T:
+        lines += ax.plot(
+            *decimate(x, column, npoints, **scales), *args, **kwargs)
+    return lines
+
+
+# Record data to be saved with the current figure in headless mode
+def record(**arrays):
+    if headless:
+        _recorded.update(arrays)
+
+
+# Collect the data plotted in the current figure
+def _figure_data():
+    import sys
+    data = {}
+    if 'matplotlib.pyplot' in sys.modules:
+        import matplotlib.pyplot as plt
+        if plt.get_fignums():
+            for i, ax in enumerate(plt.gcf().axes):
+                for j, line in enumerate(ax.get_lines()):
+                    data[f'ax{i}_line{j}_x'] = np.asarray(line.get_xdata())
+                    data[f'ax{i}_line{j}_y'] = np.asarray(line.get_ydata())
+    data.update(_recorded)
+    return data
+
 
 # Print a figure
-def savefig(name, pad=0.1, **kwargs):
-    plt.tight_layout(pad=pad)   # clean up plots
-    plt.savefig(name)           # save to file
+#
+# The name can be a single file name or a list of file names, or a base name
+# plus a list of formats (e.g., formats=['png', 'eps']).  The layout is only
+# computed once and then each file is rendered from the same layout.
+def savefig(name, pad=0.1, formats=None, **kwargs):
+    names = [name] if isinstance(name, str) else list(name)
+    if formats is not None:
+        names = [
+            os.path.splitext(base)[0] + '.' + fmt
+            for base in names for fmt in formats]
+
+    if headless:
+        # Save the plotted data instead of rendering the figure
+        data = _figure_data()
+        for base in dict.fromkeys(os.path.splitext(n)[0] for n in names):
+            np.savez_compressed(base + '.npz', **data)
+        return
+
+    plt = _pyplot()
+    plt.tight_layout(pad=pad)   # clean up plots (once for all formats)
+    for filename in names:
+        plt.savefig(filename)   # save to file
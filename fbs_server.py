@@ -0,0 +1,338 @@
+# fbs_server.py - preloaded interpreter for running figure scripts
+#
+# Most of the time spent running a single figure script goes into importing
+# python-control, scipy and matplotlib and setting up the shared models.
+# This module implements a long-lived server that does this work once and
+# then forks a fresh child process for each script that it is asked to run.
+# The output of the script (stdout and stderr) and its exit code are
+# streamed back to the client, so iterating on a single figure only costs
+# the compute and render time for that figure.
+#
+# Usage:
+#   python fbs_server.py serve &                # start the server
+#   python fbs_server.py run figure-1.11-cruise_robustness.py
+#
+# The server relies on os.fork and Unix domain sockets, so it only runs on
+# POSIX systems.  Local modules (cruise.py, fbs.py, etc) that have been
+# edited since the server started, along with the local modules that import
+# them, are re-imported by the script.  To shut down the server, interrupt
+# it (Ctrl-C or SIGINT).
+
+import json
+import os
+import select
+import signal
+import socket
+import struct
+import sys
+import tempfile
+import traceback
+
+# Directory containing the examples
+example_dir = os.path.dirname(os.path.abspath(__file__))
+
+# Default location of the server socket
+default_address = os.path.join(
+    tempfile.gettempdir(), 'fbs_server-%d.sock' % os.getuid())
+
+# Modules to import before forking
+preload_packages = [
+    'numpy', 'scipy.integrate', 'scipy.optimize', 'scipy.signal',
+    'matplotlib.pyplot', 'control']
+preload_modules = [
+    'fbs', 'cruise', 'predprey', 'congctrl', 'steering', 'bicycle',
+    'springmass']
+
+# Message types used to send results back to the client
+_STDOUT, _STDERR, _EXIT = b'O', b'E', b'X'
+
+
+#
+# Messages
+#
+# Requests are sent as a single line of JSON.  Replies are a sequence of
+# frames consisting of a one byte message type, a four byte length and the
+# message payload.
+#
+
+def _send_frame(conn, kind, data):
+    conn.sendall(kind + struct.pack('!I', len(data)) + data)
+
+
+def _recv_exact(conn, size):
+    data = b''
+    while len(data) < size:
+        chunk = conn.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("connection closed by server")
+        data += chunk
+    return data
+
+
+def _recv_frame(conn):
+    header = _recv_exact(conn, 5)
+    kind, size = header[:1], struct.unpack('!I', header[1:])[0]
+    return kind, _recv_exact(conn, size)
+
+
+def _recv_request(conn):
+    data = b''
+    while not data.endswith(b'\n'):
+        chunk = conn.recv(4096)
+        if not chunk:
+            break
+        data += chunk
+    return json.loads(data)
+
+
+#
+# Server
+#
+
+class _Preloaded:
+    """State of the server process after preloading the modules."""
+    def __init__(self):
+        # Run the scripts the same way as run_all.sh
+        os.environ['PYCONTROL_TEST_EXAMPLES'] = '1'
+        os.environ.setdefault('MPLBACKEND', 'Agg')
+        if example_dir not in sys.path:
+            sys.path.insert(0, example_dir)
+
+        import importlib
+        from figcache import dependencies
+        self.dependencies = dependencies
+        for name in preload_packages:
+            importlib.import_module(name)
+
+        # Save the matplotlib settings before fbs changes the fonts
+        import matplotlib
+        self.rcparams = matplotlib.rcParams.copy()
+
+        # Import the local modules, keeping track of the modification times
+        # of all local modules that they import
+        for name in preload_modules:
+            importlib.import_module(name)
+        self.files = _local_modules()
+        self.mtimes = {
+            name: os.path.getmtime(filename)
+            for name, filename in self.files.items()}
+
+    def reset(self, script):
+        """Set up the module state for running a script (in the child)."""
+        import matplotlib
+
+        # Reload any local modules that have changed since preloading, as
+        # well as the modules that depend on them (so that they do not keep
+        # references to the old versions)
+        changed = {
+            os.path.basename(filename)
+            for name, filename in self.files.items()
+            if not os.path.exists(filename) or
+            os.path.getmtime(filename) != self.mtimes[name]}
+        if changed:
+            for name, filename in self.files.items():
+                if changed.intersection(self.dependencies(
+                        os.path.basename(filename), example_dir)):
+                    sys.modules.pop(name, None)
+
+        # Only scripts that use fbs should see its font settings
+        directory, filename = os.path.split(script)
+        if 'fbs.py' not in self.dependencies(filename, directory) or \
+           'fbs' not in sys.modules:
+            matplotlib.rcParams.update(self.rcparams)
+
+
+# Find the modules in sys.modules that were loaded from the example directory
+def _local_modules():
+    files = {}
+    for name, module in list(sys.modules.items()):
+        filename = getattr(module, '__file__', None)
+        if name != '__main__' and filename and \
+           os.path.dirname(os.path.abspath(filename)) == example_dir:
+            files[name] = os.path.abspath(filename)
+    return files
+
+
+def _run_script(state, request):
+    """Run a script in the current process and return the exit code."""
+    import runpy
+
+    script = os.path.abspath(os.path.join(request['cwd'], request['script']))
+    os.chdir(request['cwd'])
+    sys.argv = [script] + list(request.get('args', []))
+    sys.path[0] = os.path.dirname(script)
+    sys.stdout.reconfigure(line_buffering=True)
+    sys.stderr.reconfigure(line_buffering=True)
+
+    try:
+        state.reset(script)
+        runpy.run_path(script, run_name='__main__')
+        status = 0
+    except SystemExit as exc:
+        status = exc.code if isinstance(exc.code, int) else \
+            0 if exc.code is None else 1
+        if not isinstance(exc.code, (int, type(None))):
+            print(exc.code, file=sys.stderr)
+    except BaseException:
+        traceback.print_exc()
+        status = 1
+
+    sys.stdout.flush()
+    sys.stderr.flush()
+    return status
+
+
+def _handle(state, conn):
+    """Handle a single client connection (in a child of the server)."""
+    request = _recv_request(conn)
+
+    # Fork a worker to run the script, capturing its output in pipes
+    out_read, out_write = os.pipe()
+    err_read, err_write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        conn.close()
+        os.close(out_read)
+        os.close(err_read)
+        os.dup2(out_write, 1)
+        os.dup2(err_write, 2)
+        os._exit(_run_script(state, request))
+    os.close(out_write)
+    os.close(err_write)
+
+    # Forward the output to the client as it is generated
+    streams = {out_read: _STDOUT, err_read: _STDERR}
+    while streams:
+        ready, _, _ = select.select(list(streams), [], [])
+        for fd in ready:
+            data = os.read(fd, 65536)
+            if data:
+                _send_frame(conn, streams[fd], data)
+            else:
+                os.close(fd)
+                del streams[fd]
+
+    _, status = os.waitpid(pid, 0)
+    _send_frame(conn, _EXIT, b'%d' % os.waitstatus_to_exitcode(status))
+
+
+def serve(address=default_address):
+    """Preload the FBS modules and serve requests to run scripts.
+
+    Parameters
+    ----------
+    address : str, optional
+        Path of the Unix domain socket to listen on.
+
+    """
+    state = _Preloaded()
+
+    if os.path.exists(address):
+        os.remove(address)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(address)
+    server.listen()
+    print("fbs_server: listening on %s" % address, flush=True)
+
+    # Let the system reap the connection handlers
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+
+    try:
+        while True:
+            conn, _ = server.accept()
+            if os.fork() == 0:
+                # Connection handler: restore normal child handling so that
+                # we can get the exit status of the worker
+                signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+                server.close()
+                status = 0
+                try:
+                    _handle(state, conn)
+                except BaseException:
+                    traceback.print_exc()
+                    status = 1
+                finally:
+                    conn.close()
+                    os._exit(status)
+            conn.close()
+    finally:
+        server.close()
+        if os.path.exists(address):
+            os.remove(address)
+
+
+#
+# Client
+#
+
+def run(script, args=(), address=default_address, cwd=None,
+        stdout=None, stderr=None):
+    """Run a script using the FBS server.
+
+    Parameters
+    ----------
+    script : str
+        Script to run.
+    args : list of str, optional
+        Command line arguments for the script.
+    address : str, optional
+        Path of the server socket.
+    cwd : str, optional
+        Directory in which to run the script (default: current directory).
+    stdout, stderr : file, optional
+        Binary streams to which the output of the script is written
+        (default: sys.stdout.buffer, sys.stderr.buffer).
+
+    Returns
+    -------
+    int
+        Exit code of the script.
+
+    """
+    stdout = sys.stdout.buffer if stdout is None else stdout
+    stderr = sys.stderr.buffer if stderr is None else stderr
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+        conn.connect(address)
+        request = {
+            'script': script, 'args': list(args),
+            'cwd': os.path.abspath(cwd or os.getcwd())}
+        conn.sendall(json.dumps(request).encode() + b'\n')
+
+        while True:
+            kind, data = _recv_frame(conn)
+            if kind == _STDOUT:
+                stdout.write(data)
+                stdout.flush()
+            elif kind == _STDERR:
+                stderr.write(data)
+                stderr.flush()
+            elif kind == _EXIT:
+                return int(data)
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="Preloaded interpreter for running FBS scripts.")
+    parser.add_argument('--address', default=default_address,
+                        help="server socket (default: %(default)s)")
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('serve', help="start the server")
+    run_parser = commands.add_parser('run', help="run a script")
+    run_parser.add_argument('script')
+    run_parser.add_argument('args', nargs=argparse.REMAINDER)
+    args = parser.parse_args(argv)
+
+    if args.command == 'serve':
+        try:
+            serve(args.address)
+        except KeyboardInterrupt:
+            pass
+        return 0
+    else:
+        return run(args.script, args.args, args.address)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
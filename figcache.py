@@ -0,0 +1,239 @@
+# figcache.py - incremental rebuild cache for example and figure scripts
+#
+# Most changes to this directory touch a single script or one of the shared
+# modules (cruise.py, predprey.py, fbs.py, etc).  This module keeps a
+# content-hash cache of the files written by each script so that a rebuild
+# only needs to re-run the scripts whose dependencies have changed.
+#
+# The cache key for a script is computed from the contents of the script,
+# the contents of all local modules that it imports (directly or
+# indirectly, ignoring tooling such as golden.py), and the versions of the
+# main packages that the scripts use.  Each script is run in a scratch
+# directory so that the files it writes can be identified; these files are
+# then stored in the cache and copied back to the example directory.
+#
+# The cache is used by run_examples.py when the --cache option is given.
+
+import ast
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+from importlib import metadata
+
+from run_examples import example_dir, run_script
+
+# Location of the cache (ignored by git)
+cache_dir = os.path.join(example_dir, '.fbs_cache', 'figures')
+
+# Packages whose version is included in the cache key
+cache_packages = ['control', 'numpy', 'scipy', 'matplotlib']
+
+# Runner-side modules imported by the scripts that do not affect the files
+# they write (not included in the cache key)
+tooling_modules = {
+    'golden.py', 'instrument.py', 'run_examples.py', 'figcache.py',
+    'fbs_server.py'}
+
+# Lock used to serialize updates to the manifest
+_manifest_lock = threading.Lock()
+
+
+# Find the local modules imported by a file
+def local_imports(filename, directory=example_dir):
+    with open(filename, 'rb') as file:
+        tree = ast.parse(file.read(), filename)
+
+    modules = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 \
+             and node.module is not None:
+            names = [node.module]
+        else:
+            continue
+        for name in names:
+            module = name.split('.')[0]
+            if os.path.exists(os.path.join(directory, module + '.py')):
+                modules.add(module + '.py')
+    return modules
+
+
+def dependencies(script, directory=example_dir):
+    """Return the local files that a script depends on.
+
+    Parameters
+    ----------
+    script : str
+        Name of the script (relative to `directory`).
+    directory : str, optional
+        Directory containing the script and the shared modules.
+
+    Returns
+    -------
+    list of str
+        Sorted list of file names, including the script itself and all
+        local modules that it imports, directly or indirectly (except for
+        the `tooling_modules`).
+
+    """
+    closure, pending = set(), [script]
+    while pending:
+        name = pending.pop()
+        if name in closure:
+            continue
+        closure.add(name)
+        pending.extend(
+            module for module in local_imports(
+                os.path.join(directory, name), directory)
+            if module not in tooling_modules)
+    return sorted(closure)
+
+
+# Compute the hash of a file
+def file_hash(filename):
+    with open(filename, 'rb') as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+
+def cache_key(script, directory=example_dir):
+    """Compute the cache key for a script.
+
+    Returns
+    -------
+    key : str
+        Hash of the dependency closure of the script and package versions.
+    deps : dict
+        Dictionary mapping each dependency to the hash of its contents.
+
+    """
+    deps = {name: file_hash(os.path.join(directory, name))
+            for name in dependencies(script, directory)}
+
+    key = hashlib.sha256()
+    key.update(sys.version.split()[0].encode())
+    for package in cache_packages:
+        try:
+            key.update(f"{package}={metadata.version(package)}".encode())
+        except metadata.PackageNotFoundError:
+            pass
+    for name, digest in deps.items():
+        key.update(f"{name}:{digest}".encode())
+    return key.hexdigest(), deps
+
+
+# Read and write the cache manifest
+def _manifest_file(cache=cache_dir):
+    return os.path.join(cache, 'manifest.json')
+
+
+def load_manifest(cache=cache_dir):
+    try:
+        with open(_manifest_file(cache)) as file:
+            return json.load(file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _save_entry(script, entry, cache=cache_dir):
+    # Re-read the manifest so that entries from other scripts are kept
+    with _manifest_lock:
+        manifest = load_manifest(cache)
+        manifest[script] = entry
+        tmpfile = _manifest_file(cache) + '.%d.tmp' % os.getpid()
+        with open(tmpfile, 'w') as file:
+            json.dump(manifest, file, indent=2, sort_keys=True)
+        os.replace(tmpfile, _manifest_file(cache))
+
+
+def is_current(script, directory=example_dir, cache=cache_dir):
+    """Check whether the cached outputs for a script are up to date."""
+    entry = load_manifest(cache).get(script)
+    if entry is None or entry['key'] != cache_key(script, directory)[0]:
+        return False
+    return all(
+        os.path.exists(os.path.join(cache, entry['key'], output))
+        for output in entry['outputs'])
+
+
+def restore(script, directory=example_dir, cache=cache_dir):
+    """Copy the cached outputs for a script to the example directory.
+
+    Returns
+    -------
+    list of str or None
+        Names of the restored files, or None if the cache is out of date.
+
+    """
+    if not is_current(script, directory, cache):
+        return None
+    entry = load_manifest(cache)[script]
+    for output in entry['outputs']:
+        shutil.copy2(
+            os.path.join(cache, entry['key'], output),
+            os.path.join(directory, output))
+    return entry['outputs']
+
+
+def run_cached(script, env=None, directory=example_dir, cache=cache_dir):
+    """Run a script, using the cached outputs if they are up to date.
+
+    The script is only run if its dependency closure has changed since the
+    last successful run.  Otherwise the cached output files are copied to
+    `directory`.  The return value has the same form as
+    `run_examples.run_script`, with additional keys `cached` (True if the
+    outputs were restored from the cache) and `outputs` (list of files
+    written by the script).
+
+    """
+    key, deps = cache_key(script, directory)
+    outputs = restore(script, directory, cache)
+    if outputs is not None:
+        return {
+            'script': script, 'status': 0, 'wall_time': 0.,
+            'user_time': 0., 'system_time': 0., 'cpu_time': 0.,
+            'max_rss': 0, 'output': '', 'cached': True, 'outputs': outputs}
+
+    # Run the script in a scratch directory to collect its output files
+    with tempfile.TemporaryDirectory() as workdir:
+        result = run_script(
+            os.path.join(directory, script), env, cwd=workdir)
+        result['script'] = script
+        outputs = sorted(
+            name for name in os.listdir(workdir)
+            if os.path.isfile(os.path.join(workdir, name)))
+
+        # Copy the outputs to the example directory (even on failure)
+        for output in outputs:
+            shutil.copy2(
+                os.path.join(workdir, output),
+                os.path.join(directory, output))
+
+        # Store the outputs of a successful run in the cache
+        if result['status'] == 0:
+            os.makedirs(os.path.join(cache, key), exist_ok=True)
+            for output in outputs:
+                shutil.copy2(
+                    os.path.join(workdir, output),
+                    os.path.join(cache, key, output))
+            _save_entry(script, {
+                'key': key, 'deps': deps, 'outputs': outputs}, cache)
+
+    result['cached'] = False
+    result['outputs'] = outputs
+    return result
+
+
+# Remove cache entries that are no longer referenced by the manifest
+def prune(cache=cache_dir):
+    keep = {entry['key'] for entry in load_manifest(cache).values()}
+    if not os.path.isdir(cache):
+        return
+    for name in os.listdir(cache):
+        path = os.path.join(cache, name)
+        if os.path.isdir(path) and name not in keep:
+            shutil.rmtree(path)
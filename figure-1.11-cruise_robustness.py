@@ -15,6 +15,7 @@ import numpy as np
 import matplotlib.pyplot as plt
 import control as ct
 import cruise                   # vehicle dynamics, PI controller
+import golden                   # golden data regression checks
 
 # Define the time and input vectors
 T = np.linspace(0, 25, 101)
@@ -36,21 +37,24 @@ plt.plot([5, 5], [18.75, 20.25], 'k:')                  # disturbance start
 
 masses = [1200, 1600, 2000]
 for i, m in enumerate(masses):
+    # Create the closed loop system for this mass
+    cruise_PI = cruise.create_cruise_PI({'m': m})
+
     # Compute the equilibrium state for the system
-    X0, U0 = ct.find_eqpt(
-        cruise.cruise_PI,
-        [vref[0], 0],
-        [vref[0], gear[0], theta0[0]], 
-        iu=[1, 2], y0=[vref[0], 0], iy=[0], params={'m': m})
+    X0, U0 = cruise.cruise_PI_equilibrium(
+        vref[0], gear[0], theta0[0], params={'m': m})
+    X0 = X0[:, 0]
 
     # Simulate the effect of a hill
     t, y = ct.input_output_response(
-        cruise.cruise_PI, T,
+        cruise_PI, T,
         [vref, gear, theta_hill],
-        X0, params={'m':m})
+        X0)
+
+    golden.register('v_m%d' % m, y[cruise_PI.find_output('v')])
 
     # Plot the response for this mass
-    plt.plot(t, y[cruise.cruise_PI.find_output('v')], label='m = %d' % m)
+    plt.plot(t, y[cruise_PI.find_output('v')], label='m = %d' % m)
 
 # Add labels and legend to the plot
 plt.xlabel('Time [s]')
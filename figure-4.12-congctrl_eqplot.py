@@ -9,6 +9,7 @@ import matplotlib.pyplot as plt
 import numpy as np
 import scipy.optimize
 import fbs                      # FBS plotting customizations
+import golden                   # golden data regression checks
 
 # Range of values to plot (\alpha = 1/(2\rho^2 N^2)
 alpha_vals = np.logspace(-2, 4)
@@ -22,6 +23,7 @@ for alpha in alpha_vals:
 
     bratio = scipy.optimize.fsolve(equilibrium, 0)
     bratio_vals.append(bratio)
+golden.register('bratio_vals', bratio_vals)
 
 # Set up a figure for plotting the results
 fbs.figure('mlh')
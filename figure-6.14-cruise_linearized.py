@@ -5,41 +5,17 @@ import matplotlib.pyplot as plt
 import numpy as np
 import control as ct
 import fbs                      # FBS plotting customizations
+import golden                   # golden data regression checks
 
-# System definition
-from cruise import vehicle_dynamics as vehicle
+# System definition (with the default parameters bound in advance)
+from cruise import create_vehicle, vehicle_equilibrium, linearize_vehicle
+vehicle = create_vehicle()
 
 # Figure out the equilibrium point for the system at 20 m/s
-xe, ue = ct.find_eqpt(vehicle, 20, u0=[0, 4, 0], iu=[1, 2], y0=20, iy=[0])
+xe, ue = vehicle_equilibrium(20, gear=4, theta=0)
 
-# Linearized dynamics
-vehicle_lin = vehicle.linearize(xe, ue)
-
-# Controller: PI + antiwindup
-ctrl_params = {'kp': 0.5, 'ki': 0.1, 'kaw': 2}
-
-def ctrl_update(t, x, u, params):
-    e = u[1] - u[0]                     # v - vref
-    v_nom = -params['kp'] * e + x[0]    # nominal control input (PI)
-    v_sat = np.clip(v_nom, 0, 1)        # clipped control input
-    return -params['ki'] * e + params['kaw'] * (v_sat - v_nom)
-
-def ctrl_output(t, x, u, params):
-    e = u[1] - u[0]                     # v - vref
-    v_nom = -params['kp'] * e + x[0]    # nominal control input (PI)
-    v_sat = np.clip(v_nom, 0, 1)        # clipped control input
-    return v_sat
-
-ctrl = ct.nlsys(
-    ctrl_update, ctrl_output, states=1, name='ctrl',
-    inputs=['vref', 'v'], outputs='u', params=ctrl_params)
-
-# Figure out the equilibrium point for the system at 20 m/s
-xe, ue = ct.find_eqpt(vehicle, 20, u0=[0, 4, 0], iu=[1, 2], y0=20, iy=[0])
-
-# Linearized dynamics
-vehicle_lin = vehicle.linearize(
-    xe, ue, inputs=vehicle.input_labels, outputs=vehicle.output_labels)
+# Linearized dynamics (using the analytic Jacobian)
+vehicle_lin = linearize_vehicle(xe, ue)
 
 # Controller: PI + antiwindup
 ctrl_params = {'kp': 0.5, 'ki': 0.1, 'kaw': 2}
@@ -85,6 +61,12 @@ ln_resp2a = ct.input_output_response(
 ln_resp2b = ct.input_output_response(
     lnsys, T2, [20, 4, 0.105], X0=ln_resp1.states[:, -1])
 
+for name, resp in [
+        ('nl_resp1', nl_resp1), ('nl_resp2a', nl_resp2a),
+        ('nl_resp2b', nl_resp2b), ('ln_resp1', ln_resp1),
+        ('ln_resp2a', ln_resp2a), ('ln_resp2b', ln_resp2b)]:
+    golden.register(name, resp.outputs)
+
 # Plot the velocity response
 fig, axs = plt.subplots(2, 1, figsize=[3.4, 3.4], sharex=True)
 
@@ -0,0 +1,226 @@
+# golden.py - numerical golden-data regression store
+#
+# The figures are the only output of most scripts, which makes it hard to
+# check that an optimization has not changed the results.  This module lets
+# a script register the key arrays that it computes (responses, eigenvalue
+# sweeps, bifurcation branches, etc), which can then be stored as golden
+# files or compared against previously stored golden files:
+#
+#   import golden
+#   golden.register('eigvals', eig_vals, rtol=1e-8)
+#
+# Registration does nothing unless the FBS_GOLDEN environment variable is
+# set.  If FBS_GOLDEN=record, the registered arrays are written to
+# golden/<script>.npz when the script exits.  If FBS_GOLDEN=check, they are
+# compared against the stored arrays (using the tolerances given when the
+# arrays were recorded) and the script exits with an error if any of them
+# differ.
+#
+# To record or check all of the scripts that register data, use
+#
+#   python golden.py [--record] [script.py ...]
+#
+# which runs the scripts in parallel using run_examples.py.
+
+import atexit
+import datetime
+import json
+import os
+import sys
+
+import numpy as np
+
+# Directory containing the golden files
+golden_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'golden')
+
+# Version of the golden file format
+format_version = 1
+
+# Default tolerances
+default_rtol = 1e-5
+default_atol = 1e-8
+
+# Mode of operation: None, 'record' or 'check'
+mode = os.environ.get('FBS_GOLDEN') or None
+
+# Registered arrays: {name: (array, rtol, atol)}
+_registry = {}
+
+
+# Name of the script being run (used as the name of the golden file)
+def _script_name():
+    return os.path.splitext(os.path.basename(sys.argv[0]))[0]
+
+
+def golden_file(script=None):
+    """Return the name of the golden file for a script."""
+    script = _script_name() if script is None else \
+        os.path.splitext(os.path.basename(script))[0]
+    return os.path.join(golden_dir, script + '.npz')
+
+
+def register(name, array, rtol=default_rtol, atol=default_atol):
+    """Register an array to be recorded or checked.
+
+    Parameters
+    ----------
+    name : str
+        Name of the array (must be unique within a script).
+    array : array_like
+        Data to record or check.  NaN values (used to break lines in plots)
+        are compared as equal.
+    rtol, atol : float, optional
+        Relative and absolute tolerances used when checking the array.
+
+    """
+    if mode is None:
+        return
+    if mode not in ('record', 'check'):
+        raise ValueError(f"unknown FBS_GOLDEN mode '{mode}'")
+    if not _registry:
+        atexit.register(_finish)
+    _registry[name] = (np.array(array), rtol, atol)
+
+
+def record(filename=None):
+    """Write the registered arrays to a golden file."""
+    filename = filename or golden_file()
+    revision = 0
+    if os.path.exists(filename):
+        with np.load(filename) as old:
+            revision = json.loads(str(old['__meta__']))['revision'] + 1
+
+    meta = {
+        'format': format_version, 'revision': revision,
+        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        'tolerances': {
+            name: [rtol, atol] for name, (_, rtol, atol) in _registry.items()},
+        'versions': _package_versions(),
+    }
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    np.savez_compressed(
+        filename, __meta__=json.dumps(meta),
+        **{name: array for name, (array, _, _) in _registry.items()})
+
+
+def check(filename=None):
+    """Compare the registered arrays against a golden file.
+
+    Returns
+    -------
+    list of str
+        Descriptions of the differences (empty if all arrays match).
+
+    """
+    filename = filename or golden_file()
+    if not os.path.exists(filename):
+        return [f"no golden file {filename}"]
+
+    errors = []
+    with np.load(filename) as golden:
+        meta = json.loads(str(golden['__meta__']))
+        if meta['format'] != format_version:
+            return [f"golden file format {meta['format']} is not supported"]
+        for name, (array, _, _) in _registry.items():
+            if name not in golden:
+                errors.append(f"{name}: not in golden file")
+                continue
+            rtol, atol = meta['tolerances'][name]
+            errors += compare(name, array, golden[name], rtol, atol)
+        for name in meta['tolerances']:
+            if name not in _registry:
+                errors.append(f"{name}: not registered")
+    return errors
+
+
+def compare(name, array, expected, rtol=default_rtol, atol=default_atol):
+    """Compare an array with its expected value.
+
+    Returns
+    -------
+    list of str
+        Description of the difference (empty if the arrays match).
+
+    """
+    if array.shape != expected.shape:
+        return [f"{name}: shape {array.shape} != {expected.shape}"]
+    if np.allclose(array, expected, rtol=rtol, atol=atol, equal_nan=True):
+        return []
+
+    # NaN in only one of the arrays counts as an infinite error
+    both_nan = np.isnan(array) & np.isnan(expected)
+    with np.errstate(invalid='ignore'):
+        error = np.where(both_nan, 0, np.abs(array - expected))
+    error = np.nan_to_num(error, nan=np.inf)
+    return [f"{name}: max error {np.max(error):.3g} "
+            f"(rtol={rtol:g}, atol={atol:g})"]
+
+
+def _package_versions():
+    from importlib import metadata
+    versions = {'python': sys.version.split()[0]}
+    for package in ['control', 'numpy', 'scipy']:
+        try:
+            versions[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            pass
+    return versions
+
+
+# Record or check the registered data when the script exits
+def _finish():
+    if mode == 'record':
+        record()
+        print(f"golden: recorded {len(_registry)} arrays in {golden_file()}",
+              file=sys.stderr)
+    elif mode == 'check':
+        errors = check()
+        if errors:
+            print("golden: results differ from " + golden_file(),
+                  file=sys.stderr)
+            for error in errors:
+                print("  " + error, file=sys.stderr)
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(1)
+
+
+def main(argv=None):
+    import argparse
+    import tempfile
+    from figcache import local_imports
+    from run_examples import example_dir, find_scripts, run_examples
+
+    parser = argparse.ArgumentParser(
+        description="Record or check golden data for the FBS scripts.")
+    parser.add_argument(
+        '--record', action='store_true',
+        help="record new golden files instead of checking")
+    parser.add_argument(
+        'scripts', nargs='*',
+        help="scripts to run (default: all scripts that use golden)")
+    args = parser.parse_args(argv)
+
+    scripts = [os.path.abspath(script) for script in args.scripts] or [
+        os.path.join(example_dir, script) for script in find_scripts()
+        if 'golden.py' in local_imports(os.path.join(example_dir, script))]
+
+    # Run the scripts in a scratch directory, since we only need the data
+    os.environ['FBS_GOLDEN'] = 'record' if args.record else 'check'
+    os.environ.setdefault('FBS_HEADLESS', '1')  # no need to render figures
+    with tempfile.TemporaryDirectory() as workdir:
+        results = run_examples(scripts, cwd=workdir)
+    errors = [os.path.basename(result['script'])
+              for result in results if result['status']]
+    if errors:
+        print("These scripts did not match the golden data:" if not
+              args.record else "These scripts had errors:")
+        print(" " + " ".join(errors))
+        return 1
+    print("All golden data recorded" if args.record else
+          "All results match the golden data")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
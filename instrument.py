@@ -0,0 +1,344 @@
+# instrument.py - RHS and solver instrumentation for the FBS examples
+#
+# This module provides an opt-in instrumentation layer that records where
+# the time goes when a script is run: evaluation of the update and output
+# functions of each system, the overhead of interconnected systems, the ODE
+# solver (number of function evaluations and accepted/rejected steps for
+# each call to ct.input_output_response), and saving figures.  With the
+# --memory option, memory use is also tracked using tracemalloc and the
+# resident set size (RSS) high-water mark, and the top allocation sites are
+# reported.  For each simulation, the peak traced memory above the starting
+# level and the growth of the RSS high-water mark during the call are
+# recorded (the high-water mark itself is process-wide).
+#
+# To profile a script, run it through this module:
+#
+#   python instrument.py [--report FILE] [--memory] script.py [args]
+#
+# which prints a summary and writes a JSON report (by default to
+# <script>.profile.json).  The same thing is done for all scripts by
+# run_examples.py --profile (or --memory).  Instrumentation can also be
+# turned on from Python by calling install() before the systems are
+# simulated.
+#
+# Instrumentation works by wrapping methods of the python-control system
+# classes, so it applies to the systems created in the shared modules
+# (cruise.py, predprey.py, etc) as well as those in the scripts.
+
+import functools
+import json
+import os
+import resource
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+
+# Statistics for each system, indexed by system name
+systems = defaultdict(lambda: {
+    'rhs_calls': 0, 'rhs_time': 0., 'out_calls': 0, 'out_time': 0.})
+
+# Statistics for each simulation
+simulations = []
+
+# Statistics for saving figures
+figures = {'calls': 0, 'time': 0.}
+
+# Internal state
+_installed = False
+_leaf_time = 0.                 # time spent in (non-interconnected) systems
+_current = None                 # statistics for the current simulation
+_peak_traced = 0                # peak traced memory before last reset
+
+# Number of allocation sites to include in the memory report
+top_allocations = 10
+
+# Number of function evaluations per step attempt for Runge-Kutta methods
+_rk_stages = {'RK23': 3, 'RK45': 6, 'DOP853': 12}
+
+
+# Wrap the update/output method of a system with a timer
+def _time_method(method, kind, leaf):
+    @functools.wraps(method)
+    def wrapper(self, t, x, u):
+        global _leaf_time
+        nested = _leaf_time
+        start = time.perf_counter()
+        try:
+            return method(self, t, x, u)
+        finally:
+            elapsed = time.perf_counter() - start
+            stats = systems[self.name]
+            stats[kind + '_calls'] += 1
+            if leaf:
+                stats[kind + '_time'] += elapsed
+                _leaf_time = nested + elapsed
+            else:
+                # Only count time not spent in the subsystems
+                stats[kind + '_time'] += elapsed - (_leaf_time - nested)
+                stats['interconnect'] = True
+    return wrapper
+
+
+# Create a version of a solver class that counts the accepted steps
+def _counting_solver(solver):
+    class CountingSolver(solver):
+        def step(self):
+            message = super().step()
+            if _current is not None and self.status != 'failed':
+                _current['steps'] += 1
+            return message
+    CountingSolver.__name__ = solver.__name__
+    return CountingSolver
+
+
+def _wrap_solve_ivp(solve_ivp):
+    import scipy.integrate
+
+    @functools.wraps(solve_ivp)
+    def wrapper(fun, t_span, y0, method='RK45', **kwargs):
+        global _current
+        toplevel = _current is None
+        if toplevel:
+            _current = _new_simulation('solve_ivp')
+        name = method if isinstance(method, str) else method.__name__
+        if isinstance(method, str) and hasattr(scipy.integrate, method):
+            method = _counting_solver(getattr(scipy.integrate, method))
+
+        try:
+            soln = solve_ivp(fun, t_span, y0, method=method, **kwargs)
+        finally:
+            stats = _current
+            if toplevel:
+                _finish_simulation()
+
+        stats['method'] = name
+        stats['nfev'] += soln.nfev
+        stats['njev'] += soln.njev
+        stats['nlu'] += soln.nlu
+        stats['npoints'] += len(soln.t)
+        if name in _rk_stages:
+            # Initial derivative and step size selection use two evaluations
+            attempts = (soln.nfev - 2) // _rk_stages[name]
+            stats['rejected'] += max(attempts - stats['steps'], 0)
+        stats['success'] = stats['success'] and bool(soln.success)
+        return soln
+    return wrapper
+
+
+# Resident set size high-water mark for this process [bytes]
+def max_rss():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+def _new_simulation(system):
+    global _peak_traced
+    stats = {
+        'system': system, 'method': None, 'wall_time': 0., 'rhs_time': 0.,
+        'nfev': 0, 'njev': 0, 'nlu': 0, 'steps': 0, 'rejected': 0,
+        'npoints': 0, 'success': True,
+        '_start': time.perf_counter(), '_leaf': _leaf_time}
+    if tracemalloc.is_tracing():
+        # Keep track of the overall peak before resetting it
+        current, peak = tracemalloc.get_traced_memory()
+        _peak_traced = max(_peak_traced, peak)
+        tracemalloc.reset_peak()
+        stats['_traced'] = current
+        stats['_rss'] = max_rss()
+    return stats
+
+
+def _finish_simulation():
+    global _current
+    stats = _current
+    stats['wall_time'] = time.perf_counter() - stats.pop('_start')
+    stats['rhs_time'] = _leaf_time - stats.pop('_leaf')
+    if '_traced' in stats:
+        # Memory allocated during the simulation, above the starting level
+        stats['peak_traced'] = \
+            tracemalloc.get_traced_memory()[1] - stats.pop('_traced')
+
+        # Increase in the (process-wide) RSS high-water mark; this is zero
+        # unless the simulation used more memory than anything before it
+        stats['rss_growth'] = max_rss() - stats.pop('_rss')
+    simulations.append(stats)
+    _current = None
+
+
+def _wrap_simulation(simulate):
+    @functools.wraps(simulate)
+    def wrapper(sys, *args, **kwargs):
+        global _current
+        if _current is not None:
+            return simulate(sys, *args, **kwargs)
+        _current = _new_simulation(getattr(sys, 'name', None))
+        try:
+            return simulate(sys, *args, **kwargs)
+        finally:
+            _finish_simulation()
+    return wrapper
+
+
+def _wrap_savefig(savefig):
+    @functools.wraps(savefig)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return savefig(*args, **kwargs)
+        finally:
+            figures['calls'] += 1
+            figures['time'] += time.perf_counter() - start
+    return wrapper
+
+
+def install(memory=False):
+    """Turn on instrumentation of systems, simulations and figures.
+
+    Parameters
+    ----------
+    memory : bool, optional
+        If True, also trace memory allocations using tracemalloc.  This
+        slows down the script considerably.
+
+    """
+    global _installed
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    if _installed:
+        return
+    _installed = True
+
+    import importlib
+    import control
+    import scipy.integrate
+    import matplotlib.figure
+    from control.nlsys import NonlinearIOSystem, InterconnectedSystem
+
+    NonlinearIOSystem._rhs = _time_method(
+        NonlinearIOSystem._rhs, 'rhs', True)
+    NonlinearIOSystem._out = _time_method(
+        NonlinearIOSystem._out, 'out', True)
+    InterconnectedSystem._rhs = _time_method(
+        InterconnectedSystem._rhs, 'rhs', False)
+    InterconnectedSystem._out = _time_method(
+        InterconnectedSystem._out, 'out', False)
+
+    # Note: control.nlsys is the nlsys() function, not the module
+    nlsys_module = importlib.import_module('control.nlsys')
+    scipy.integrate.solve_ivp = _wrap_solve_ivp(scipy.integrate.solve_ivp)
+    control.input_output_response = nlsys_module.input_output_response = \
+        _wrap_simulation(nlsys_module.input_output_response)
+
+    matplotlib.figure.Figure.savefig = _wrap_savefig(
+        matplotlib.figure.Figure.savefig)
+
+
+def memory_report():
+    """Return the memory statistics for the process."""
+    stats = {'max_rss': max_rss()}
+    if tracemalloc.is_tracing():
+        stats['peak_traced'] = max(
+            _peak_traced, tracemalloc.get_traced_memory()[1])
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, '<frozen *>'),
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__)])
+        stats['top_allocations'] = [
+            {'file': stat.traceback[0].filename,
+             'line': stat.traceback[0].lineno,
+             'size': stat.size, 'count': stat.count}
+            for stat in snapshot.statistics('lineno')[:top_allocations]]
+    return stats
+
+
+def report(wall_time=None):
+    """Return a dictionary with the statistics collected so far."""
+    return {
+        'wall_time': wall_time,
+        'memory': memory_report(),
+        'rhs_time': sum(
+            stats['rhs_time'] + stats['out_time']
+            for stats in systems.values()),
+        'simulation_time': sum(sim['wall_time'] for sim in simulations),
+        'savefig_time': figures['time'],
+        'systems': dict(systems),
+        'simulations': simulations,
+        'figures': figures,
+    }
+
+
+def print_report(profile, file=sys.stderr):
+    """Print a summary of a profile report."""
+    print("Profile: %.3f s total, %.3f s simulating, %.3f s in RHS, "
+          "%.3f s saving figures" % (
+              profile['wall_time'] or 0, profile['simulation_time'],
+              profile['rhs_time'], profile['savefig_time']), file=file)
+    print("  %-20s %10s %10s %10s %10s" % (
+        'system', 'rhs calls', 'rhs time', 'out calls', 'out time'),
+          file=file)
+    for name, stats in sorted(
+            profile['systems'].items(), key=lambda item: -item[1]['rhs_time']):
+        print("  %-20s %10d %10.3f %10d %10.3f%s" % (
+            name, stats['rhs_calls'], stats['rhs_time'], stats['out_calls'],
+            stats['out_time'],
+            ' (interconnect overhead)' if stats.get('interconnect') else ''),
+              file=file)
+    print("  %-20s %8s %8s %8s %8s %10s" % (
+        'simulation', 'method', 'nfev', 'steps', 'rejected', 'time'),
+          file=file)
+    for sim in profile['simulations']:
+        print("  %-20s %8s %8d %8d %8d %10.3f%s" % (
+            sim['system'], sim['method'], sim['nfev'], sim['steps'],
+            sim['rejected'], sim['wall_time'],
+            "  %.1f MB" % (sim['peak_traced'] / 2**20)
+            if 'peak_traced' in sim else ''), file=file)
+
+    memory = profile['memory']
+    print("Memory: %.1f MB max RSS" % (memory['max_rss'] / 2**20), end='',
+          file=file)
+    if 'peak_traced' in memory:
+        print(", %.1f MB peak traced" % (memory['peak_traced'] / 2**20),
+              file=file)
+        for site in memory['top_allocations']:
+            print("  %10.1f kB %8d  %s:%d" % (
+                site['size'] / 1024, site['count'], site['file'],
+                site['line']), file=file)
+    else:
+        print(file=file)
+
+
+def main(argv=None):
+    import argparse
+    import runpy
+
+    parser = argparse.ArgumentParser(
+        description="Run a script with RHS and solver instrumentation.")
+    parser.add_argument(
+        '--report', help="JSON report file (default: <script>.profile.json)")
+    parser.add_argument(
+        '--memory', action='store_true',
+        help="trace memory allocations (slow)")
+    parser.add_argument('script')
+    parser.add_argument('args', nargs=argparse.REMAINDER)
+    args = parser.parse_args(argv)
+
+    install(memory=args.memory)
+    sys.argv = [args.script] + args.args
+    sys.path[0] = os.path.dirname(os.path.abspath(args.script))
+
+    start = time.perf_counter()
+    try:
+        runpy.run_path(args.script, run_name='__main__')
+    finally:
+        profile = report(time.perf_counter() - start)
+        filename = args.report or \
+            os.path.splitext(os.path.basename(args.script))[0] + \
+            '.profile.json'
+        with open(filename, 'w') as file:
+            json.dump(profile, file, indent=2)
+        print_report(profile)
+
+
+if __name__ == '__main__':
+    main()
@@ -6,26 +6,8 @@
 # loop.  Environment variable PYCONTROL_TEST_EXAMPLES is set when the
 # examples are being tested; existence of this variable should be used
 # to prevent such user-action-waiting operations.
+#
+# The scripts are run in parallel by run_examples.py, which also writes a
+# timing report (run_examples.json).  Pass -j 1 to run them one at a time.
 
-export PYCONTROL_TEST_EXAMPLES=1
-
-example_errors=""
-
-for example in *.py; do
-    echo "Running ${example}"
-    if ! python ${example}; then
-        example_errors="${example_errors} ${example}"
-    fi
-done
-    
-# Get rid of the output files
-rm *.log
-
-# List any files that generated errors
-if [ -n "${example_errors}" ]; then
-    echo These examples had errors:
-    echo "${example_errors}"
-    exit 1
-else
-    echo All examples ran successfully
-fi
+exec python "$(dirname "$0")/run_examples.py" "$@"
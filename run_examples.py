@@ -0,0 +1,284 @@
+# run_examples.py - run the example and figure scripts in parallel
+#
+# This script replaces the serial loop that used to live in run_all.sh.
+# Each example-*.py and figure-*.py file is run in its own Python process,
+# with up to one process per core running at any time.  The wall time, CPU
+# time and exit status of each script are written to a JSON report so that
+# slow or failing scripts are easy to spot.
+#
+# The examples must cooperate: they must have no operations that wait on
+# user action, like matplotlib.pyplot.show, or starting a GUI event loop.
+# Environment variable PYCONTROL_TEST_EXAMPLES is set when the examples are
+# being tested; existence of this variable should be used to prevent such
+# user-action-waiting operations.
+#
+# If the --cache option is given, scripts whose dependencies have not
+# changed since their last successful run are not re-run; their output files
+# are restored from the cache instead (see figcache.py).
+#
+# With --profile, each script is run with RHS and solver instrumentation
+# (see instrument.py) and writes a report to <script>.profile.json; --memory
+# adds allocation tracing to the profile.  The maximum resident set size of
+# each script is always recorded, and scripts that use more memory than the
+# limit set by --memory-budget are counted as errors.
+#
+# Usage: python run_examples.py [-j JOBS] [--report FILE] [--cache]
+#            [--headless] [--profile] [--memory] [--memory-budget MB]
+#            [script.py ...]
+
+import argparse
+import glob
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Directory containing the examples
+example_dir = os.path.dirname(os.path.abspath(__file__))
+
+
+# Get the list of scripts to run (in the order used by run_all.sh)
+def find_scripts(directory=example_dir):
+    scripts = glob.glob(os.path.join(directory, 'example-*.py')) + \
+        glob.glob(os.path.join(directory, 'figure-*.py'))
+    return sorted(os.path.basename(script) for script in scripts)
+
+
+# Environment used to run the examples
+def example_environment(headless=False):
+    env = dict(os.environ)
+    env['PYCONTROL_TEST_EXAMPLES'] = '1'
+    if headless:
+        env['FBS_HEADLESS'] = '1'       # save data instead of figures
+
+    # Keep numerical libraries from oversubscribing the cores
+    env.setdefault('OMP_NUM_THREADS', '1')
+    env.setdefault('OPENBLAS_NUM_THREADS', '1')
+    env.setdefault('MKL_NUM_THREADS', '1')
+    return env
+
+
+def run_script(
+        script, env=None, cwd=example_dir, profile=False, memory=False):
+    """Run a single script in a separate Python process.
+
+    Parameters
+    ----------
+    script : str
+        Name of the script to run (relative to `cwd`).
+    env : dict, optional
+        Environment for the process.  Defaults to `example_environment()`.
+    cwd : str, optional
+        Directory in which to run the script.
+    profile : bool, optional
+        If True, run the script using instrument.py, which writes a profile
+        report to <script>.profile.json in `cwd`.
+    memory : bool, optional
+        If True, include memory allocation tracing in the profile report
+        (implies `profile`).
+
+    Returns
+    -------
+    dict
+        Dictionary with the script name, exit status, wall time and CPU
+        time (user and system, in seconds), maximum resident set size (in
+        bytes), and the combined stdout/stderr output of the script.
+
+    """
+    if env is None:
+        env = example_environment()
+    command = [sys.executable, script]
+    if profile or memory:
+        command[1:1] = [os.path.join(example_dir, 'instrument.py')] + \
+            (['--memory'] if memory else [])
+
+    # Send the output to a file so that we can use os.wait4 to get the
+    # resource usage for this particular child process
+    with tempfile.TemporaryFile() as log:
+        start = time.perf_counter()
+        proc = subprocess.Popen(
+            command, cwd=cwd, env=env,
+            stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT)
+        _, status, rusage = os.wait4(proc.pid, 0)
+        wall = time.perf_counter() - start
+        proc.returncode = os.waitstatus_to_exitcode(status)
+
+        log.seek(0)
+        output = log.read().decode(errors='replace')
+
+    return {
+        'script': script,
+        'status': proc.returncode,
+        'wall_time': wall,
+        'user_time': rusage.ru_utime,
+        'system_time': rusage.ru_stime,
+        'cpu_time': rusage.ru_utime + rusage.ru_stime,
+        'max_rss': rusage.ru_maxrss * (
+            1 if sys.platform == 'darwin' else 1024),
+        'output': output,
+    }
+
+
+def run_examples(
+        scripts=None, jobs=None, cwd=example_dir, verbose=True, cache=False,
+        headless=False, profile=False, memory=False, memory_budget=None):
+    """Run a list of scripts in parallel.
+
+    Parameters
+    ----------
+    scripts : list of str, optional
+        Scripts to run.  Defaults to all example and figure scripts.
+    jobs : int, optional
+        Maximum number of scripts to run at the same time.  Defaults to the
+        number of cores.
+    cwd : str, optional
+        Directory in which to run the scripts.
+    verbose : bool, optional
+        If True (default), print a line as each script finishes and print
+        the output of any script that fails.
+    cache : bool, optional
+        If True, only run scripts whose dependencies have changed and
+        restore the outputs of the remaining scripts from the cache.
+    headless : bool, optional
+        If True, run the scripts in compute-only mode: figures created
+        using fbs are not rendered and their data is saved instead (see
+        fbs.py).  The cache is not used in headless mode.
+    profile : bool, optional
+        If True, run the scripts with RHS and solver instrumentation (see
+        instrument.py).  The cache is not used when profiling.
+    memory : bool, optional
+        If True, include memory allocation tracing in the profile.
+    memory_budget : float, optional
+        Maximum resident set size for each script, in MB.  Scripts that use
+        more memory are marked with `over_budget` and counted as errors.
+
+    Returns
+    -------
+    list of dict
+        Results for each script (see `run_script`), in the order that the
+        scripts were given.
+
+    """
+    if scripts is None:
+        scripts = find_scripts(cwd)
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    env = example_environment(headless)
+
+    if cache and not headless and not profile and not memory:
+        import figcache
+        runner = lambda script, env, cwd: figcache.run_cached(
+            script, env, directory=cwd)
+    else:
+        runner = lambda script, env, cwd: run_script(
+            script, env, cwd, profile=profile, memory=memory)
+
+    # Each worker thread just waits on a child process, so the number of
+    # threads sets the number of scripts running at the same time
+    results = {}
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = {
+            executor.submit(runner, script, env, cwd): script
+            for script in scripts}
+        for future in as_completed(futures):
+            result = results[futures[future]] = future.result()
+            result['over_budget'] = memory_budget is not None and \
+                result['max_rss'] > memory_budget * 2**20
+            if verbose:
+                print("%-45s %s (%.1f s, %.0f MB)" % (
+                    result['script'],
+                    'cached' if result.get('cached') else
+                    'ok' if result['status'] == 0 and
+                    not result['over_budget'] else
+                    'OVER BUDGET' if result['status'] == 0 else
+                    'FAILED [%d]' % result['status'], result['wall_time'],
+                    result['max_rss'] / 2**20), flush=True)
+                if result['status'] != 0:
+                    print(result['output'], flush=True)
+
+    return [results[script] for script in scripts]
+
+
+# Write out a JSON report with the timing information for each script
+def write_report(results, filename, jobs=None, elapsed=None):
+    report = {
+        'python': sys.version.split()[0],
+        'jobs': jobs or os.cpu_count(),
+        'elapsed': elapsed,
+        'wall_time': sum(result['wall_time'] for result in results),
+        'cpu_time': sum(result['cpu_time'] for result in results),
+        'scripts': [
+            {key: val for key, val in result.items() if key != 'output'}
+            for result in results],
+    }
+    with open(filename, 'w') as file:
+        json.dump(report, file, indent=2)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Run the FBS example and figure scripts in parallel.")
+    parser.add_argument(
+        'scripts', nargs='*', help="scripts to run (default: all)")
+    parser.add_argument(
+        '-j', '--jobs', type=int, default=None,
+        help="number of scripts to run at once (default: number of cores)")
+    parser.add_argument(
+        '--report', default='run_examples.json',
+        help="JSON file for the timing report (default: %(default)s)")
+    parser.add_argument(
+        '--cache', action='store_true',
+        help="only re-run scripts whose dependencies have changed")
+    parser.add_argument(
+        '--headless', action='store_true',
+        help="save plotted data instead of rendering fbs figures")
+    parser.add_argument(
+        '--profile', action='store_true',
+        help="write an RHS/solver profile report for each script")
+    parser.add_argument(
+        '--memory', action='store_true',
+        help="include memory allocation tracing in the profile (slow)")
+    parser.add_argument(
+        '--memory-budget', type=float, metavar='MB',
+        help="maximum resident set size for each script")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    results = run_examples(
+        args.scripts or None, jobs=args.jobs, cache=args.cache,
+        headless=args.headless, profile=args.profile, memory=args.memory,
+        memory_budget=args.memory_budget)
+    elapsed = time.perf_counter() - start
+
+    if args.report:
+        write_report(
+            results, os.path.join(example_dir, args.report), args.jobs,
+            elapsed)
+
+    # Drop cached outputs that are no longer used by any script
+    if args.cache:
+        import figcache
+        figcache.prune()
+
+    # Get rid of the output files
+    for log in glob.glob(os.path.join(example_dir, '*.log')):
+        os.remove(log)
+
+    # List any files that generated errors
+    errors = [result['script'] for result in results
+              if result['status'] or result['over_budget']]
+    print("Ran %d scripts in %.1f s" % (len(results), elapsed))
+    if errors:
+        print("These examples had errors:")
+        print(" " + " ".join(errors))
+        return 1
+    else:
+        print("All examples ran successfully")
+        return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
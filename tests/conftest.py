@@ -0,0 +1,9 @@
+# conftest.py - pytest configuration for the FBS modules
+#
+# The shared modules (cruise.py, bicycle.py, etc) live in the top-level
+# directory, next to the example scripts, so add it to the module path.
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,67 @@
+# test_bicycle.py - tests for the bicycle model
+
+import numpy as np
+
+import bicycle
+
+
+def test_whipple_A_batch():
+    # Evaluating an array of velocities gives a stack of matrices
+    v0 = np.linspace(0, 15, 7)
+    A = bicycle.whipple_A(v0)
+    assert A.shape == (7, 4, 4)
+    for v, Av in zip(v0, A):
+        np.testing.assert_allclose(Av, bicycle.whipple_A(float(v)))
+
+    eigvals = bicycle.whipple_eigvals(v0)
+    for v, lam in zip(v0, eigvals):
+        np.testing.assert_allclose(lam, bicycle.whipple_eigvals(float(v)))
+
+
+def test_whipple_charpoly():
+    # The characteristic polynomial has the eigenvalues of whipple_A as
+    # its roots, and Routh-Hurwitz agrees with the eigenvalues
+    v0 = np.linspace(0, 15, 31)
+    a = bicycle.whipple_charpoly(v0)
+    for v, coeffs in zip(v0, a):
+        np.testing.assert_allclose(
+            coeffs / coeffs[0],
+            np.poly(np.linalg.eigvals(bicycle.whipple_A(v))).real,
+            rtol=1e-8, atol=1e-8)
+    np.testing.assert_allclose(
+        bicycle.whipple_roots(v0), bicycle.whipple_eigvals(v0), atol=1e-8)
+
+    abscissa = np.max(bicycle.whipple_eigvals(v0).real, axis=-1)
+    np.testing.assert_array_equal(bicycle.whipple_stable(v0), abscissa < 0)
+
+
+def test_whipple_critical_speeds():
+    # The stable window is bounded by the speeds at which the largest real
+    # part of the eigenvalues changes sign
+    v_weave, v_capsize = bicycle.whipple_critical_speeds()
+    assert 0 < v_weave < v_capsize < 20
+    for v in [v_weave, v_capsize]:
+        abscissa = bicycle.spectral_abscissa(np.array([v - 1e-6, v + 1e-6]))
+        assert abscissa[0] * abscissa[1] < 0
+        assert abs(bicycle.spectral_abscissa(v)) < 1e-9
+    v0 = np.linspace(v_weave, v_capsize, 12)[1:-1]
+    assert np.all(bicycle.whipple_stable(v0))
+
+
+def test_bicycle_params():
+    # Arrays of parameters give the same results as individual geometries
+    trail = np.array([0.06, 0.08, 0.1])
+    params = bicycle.BicycleParams(c=trail)
+    np.testing.assert_allclose(
+        bicycle.whipple_A(5., params)[1], bicycle.whipple_A(5.))
+
+    v_weave, v_capsize = bicycle.whipple_critical_speeds(params=params)
+    for i, c in enumerate(trail):
+        single = bicycle.BicycleParams(c=c)
+        np.testing.assert_allclose(
+            (v_weave[i], v_capsize[i]),
+            bicycle.whipple_critical_speeds(params=single), rtol=1e-12)
+        coeffs = bicycle.charpoly_coefficients(
+            *bicycle.whipple_matrices(single))
+        np.testing.assert_array_equal(
+            bicycle.whipple_stable(v_weave[i] + 0.1, coeffs), True)
@@ -0,0 +1,173 @@
+# test_cruise.py - tests for the cruise control models
+
+import numpy as np
+import control as ct
+
+import cruise
+
+
+def test_ensemble_matches_cruise_PI():
+    # Simulating the vehicles together gives the same response as
+    # simulating each vehicle separately using cruise_PI
+    T = np.linspace(0, 20, 201)
+    U = [np.full(T.size, 20.), np.full(T.size, 4.),
+         np.clip(4/180 * np.pi * (T - 5), 0, 4/180 * np.pi)]
+    masses = np.array([1000., 1600., 2500.])
+    tol = {'rtol': 1e-9, 'atol': 1e-9}
+
+    t, y = cruise.cruise_PI_ensemble(T, U, {'m': masses}, **tol)
+    X0, _ = cruise.cruise_PI_equilibrium(20., 4, 0, {'m': masses})
+    for i, m in enumerate(masses):
+        resp = ct.input_output_response(
+            cruise.cruise_PI, T, U, X0[:, i], params={'m': m},
+            solve_ivp_kwargs=tol)
+        np.testing.assert_allclose(t, resp.time)
+        np.testing.assert_allclose(y[:, i], resp.outputs, atol=1e-6)
+
+
+# Central difference approximation of the Jacobian of f at z
+def _numerical_jacobian(f, z, eps=1e-6):
+    z = np.asarray(z, float)
+    return np.array([
+        (np.asarray(f(z + dz)) - np.asarray(f(z - dz))) / (2 * eps)
+        for dz in eps * np.eye(z.size)]).T
+
+
+def test_vehicle_jacobian():
+    # The analytic Jacobian matches finite differences (except for the
+    # gear, which is an integer input)
+    params = {'m': 1400.}
+    f = lambda x, u: cruise.vehicle_dynamics.dynamics(0, x, u, params)
+    for x, u in [([20.], [0.4, 4, 0.05]), ([10.], [0.8, 2, -0.02]),
+                 ([35.], [0.2, 5, 0.])]:
+        A, B = cruise.vehicle_jacobian(x, u, params)
+        np.testing.assert_allclose(
+            A, _numerical_jacobian(lambda z: f(z, u), x), rtol=1e-6)
+        np.testing.assert_allclose(
+            B[:, [0, 2]], _numerical_jacobian(
+                lambda z: f(x, np.insert(z, 1, u[1])), np.delete(u, 1)),
+            rtol=1e-6)
+        assert B[0, 1] == 0
+
+
+def test_cruise_PI_jacobian():
+    X0, _ = cruise.cruise_PI_equilibrium(20., 3, 0.02)
+    x, u = X0[:, 0] + [0.5, 0.01], np.array([22., 3, 0.02])
+    A, B, C, D = cruise.cruise_PI_jacobian(x, u)
+
+    sys = cruise.cruise_PI
+    for f, J, dJ in [(sys.dynamics, A, B), (sys.output, C, D)]:
+        np.testing.assert_allclose(
+            J, _numerical_jacobian(lambda z: f(0, z, u), x),
+            rtol=1e-6, atol=1e-9)
+        np.testing.assert_allclose(
+            dJ[:, [0, 2]], _numerical_jacobian(
+                lambda z: f(0, x, np.insert(z, 1, u[1])), np.delete(u, 1)),
+            rtol=1e-6, atol=1e-9)
+        np.testing.assert_array_equal(dJ[:, 1], 0)
+
+
+def test_trim_table():
+    # The trim throttle from the table matches ct.find_eqpt, both at and
+    # between the grid points
+    grid = {'vref': np.linspace(10, 30, 5), 'theta': np.linspace(-.05, .05, 3),
+            'm': np.array([1200., 2000.])}
+    table = cruise.TrimTable(grid, cache=False)
+    for v, gear, theta, m in [(20., 4, 0.05, 1200.), (17.3, 4, 0.013, 1600.),
+                              (25., 3, -0.02, 1800.)]:
+        _, ue = ct.find_eqpt(
+            cruise.vehicle_dynamics, [v], [0.5, gear, theta], y0=[v],
+            iu=[1, 2], iy=[0], params={'m': m})
+        np.testing.assert_allclose(
+            table.lookup(v, gear, theta, m), ue[0], rtol=1e-6)
+
+        xe, ue = table.vehicle_trim(v, gear, theta, m)
+        np.testing.assert_allclose(
+            cruise.vehicle_dynamics.dynamics(0, xe, ue, {'m': m}), 0,
+            atol=1e-8)
+
+
+def test_gearshift_events():
+    # At full throttle the vehicle shifts up through the gears, each time
+    # the engine speed reaches the upshift threshold
+    T = np.linspace(0, 60, 601)
+    U = [np.ones(T.size), np.zeros(T.size)]
+    resp = cruise.gearshift_response(
+        cruise.vehicle_dynamics, T, U, [5.], gear=1, omega_up=500.,
+        omega_down=250.)
+    alpha = [40, 25, 16, 12, 10]
+
+    assert [(old, new) for _, old, new in resp.shifts] == \
+        [(1, 2), (2, 3), (3, 4), (4, 5)]
+    for t, old, new in resp.shifts:
+        v = np.interp(t, resp.time, resp.y[0])
+        np.testing.assert_allclose(alpha[old - 1] * v, 500., rtol=1e-2)
+        gear = resp.inputs[cruise.vehicle_dynamics.find_input('gear')]
+        assert np.all(gear[resp.time < t] <= old)
+        assert np.all(gear[resp.time > t] >= new)
+
+    # Coasting in gear 4 shifts back down
+    resp = cruise.gearshift_response(
+        cruise.vehicle_dynamics, T, [np.zeros(T.size), np.zeros(T.size)],
+        [30.], gear=4, omega_up=500., omega_down=250.)
+    assert resp.shifts and all(
+        new == old - 1 for _, old, new in resp.shifts)
+    for t, old, _ in resp.shifts:
+        v = np.interp(t, resp.time, resp.y[0])
+        np.testing.assert_allclose(alpha[old - 1] * v, 250., rtol=1e-2)
+
+
+def test_vehicle_lpv():
+    # The LPV model matches the numerical linearization of the vehicle
+    # dynamics at the trim point (exactly at the grid points and to within
+    # the interpolation error between them)
+    grid = {'v': np.linspace(10, 30, 21), 'theta': np.linspace(-.05, .05, 11)}
+    lpv = cruise.VehicleLPV(grid, cache=False)
+    for v, gear, theta, rtol in [(20., 4, 0.03, 1e-5), (17.3, 3, 0.013, 1e-2)]:
+        xe, ue = cruise.vehicle_equilibrium(v, gear, theta)
+        linsys = ct.linearize(cruise.vehicle_dynamics, xe, ue)
+        for M, expected in zip(
+                lpv.matrices(v, gear, theta), ct.ssdata(linsys)):
+            np.testing.assert_allclose(M, expected, rtol=rtol, atol=1e-8)
+
+
+def test_gearshift_initial_speed():
+    # Starting above the upshift threshold shifts up at the initial time
+    T = np.linspace(0, 10, 101)
+    U = [np.full(T.size, 0.5), np.zeros(T.size)]
+    resp = cruise.gearshift_response(
+        cruise.vehicle_dynamics, T, U, [25.], gear=1)
+    assert resp.shifts[:2] == [(0., 1, 2), (0., 2, 3)]
+    gear = resp.inputs[cruise.vehicle_dynamics.find_input('gear')]
+    assert gear[0] == 3
+
+    # The default thresholds scale with the peak engine speed
+    params = {'omega_m': 300.}
+    resp = cruise.gearshift_response(
+        cruise.vehicle_dynamics, T, [np.ones(T.size), np.zeros(T.size)],
+        [5.], gear=1, params=params)
+    t, old, _ = resp.shifts[0]
+    v = np.interp(t, resp.time, resp.y[0])
+    np.testing.assert_allclose(40 * v, 1.2 * 300., rtol=1e-2)
+
+
+
+def test_torque_map_cache_method(tmp_path, monkeypatch):
+    # Trim tables for linear and cubic torque maps on the same grid must
+    # not share a cache entry
+    monkeypatch.setattr(cruise, 'cache_dir', str(tmp_path))
+    grid = {'vref': np.linspace(10, 30, 5), 'theta': np.zeros(1),
+            'm': np.array([1600.])}
+    linear = cruise.TorqueMap.from_params(npoints=9, method='linear')
+    cubic = cruise.TorqueMap.from_params(npoints=9, method='cubic')
+    assert not np.array_equal(linear(300.), cubic(300.))
+
+    tables = [
+        cruise.TrimTable(grid, {'torque_map': torque_map}).throttle
+        for torque_map in (linear, cubic)]
+    assert len(list((tmp_path / 'trim').iterdir())) == 2
+    assert not np.allclose(tables[0], tables[1])
+
+    # Reloading from the cache gives the table for the same method
+    reloaded = cruise.TrimTable(grid, {'torque_map': cubic}).throttle
+    np.testing.assert_array_equal(reloaded, tables[1])
@@ -0,0 +1,34 @@
+# test_cruise_cycle.py - tests for drive cycle simulation
+
+import numpy as np
+import pytest
+
+import cruise_cycle
+
+
+@pytest.fixture(scope='module')
+def cycle(tmp_path_factory):
+    filename = tmp_path_factory.mktemp('cycle') / 'cycle.npy'
+    cruise_cycle.generate_cycle(str(filename), 600)
+    return np.load(filename)
+
+
+def _simulate(cycle, **kwargs):
+    return np.concatenate(
+        [y for _, y in cruise_cycle.simulate_cycle(cycle, **kwargs)])
+
+
+def test_window_size(cycle):
+    # Windowed and unwindowed simulations agree to within 1e-6 m/s
+    full = _simulate(cycle, window=cycle.shape[0])
+    windowed = _simulate(cycle, window=500)
+    np.testing.assert_allclose(windowed, full, rtol=0, atol=1e-6)
+
+
+def test_accuracy(cycle):
+    # The default tolerances are within 0.05 m/s of a tight reference
+    reference = _simulate(
+        cycle, window=cycle.shape[0], rtol=1e-10, atol=1e-10)
+    windowed = _simulate(cycle, window=500)
+    np.testing.assert_allclose(
+        windowed[:, 0], reference[:, 0], rtol=0, atol=0.05)
@@ -0,0 +1,34 @@
+# test_decimate.py - tests for plot data decimation
+
+import numpy as np
+
+import decimate
+
+
+def _noisy_signal(n=100000, seed=0):
+    rng = np.random.default_rng(seed)
+    x = np.linspace(0, 10, n)
+    y = np.sin(x) + 0.1 * rng.standard_normal(n)
+    y[n // 3] = 5.                      # isolated peak
+    y[2 * n // 3] = -5.                 # isolated valley
+    return x, y
+
+
+def test_lttb_endpoints_and_extrema():
+    x, y = _noisy_signal()
+    for minmax_ratio in [0, 4]:
+        indices = decimate.lttb_indices(x, y, 500, minmax_ratio)
+        assert indices.size == 500
+        assert indices[0] == 0 and indices[-1] == x.size - 1
+        assert np.all(np.diff(indices) > 0)
+        assert np.argmax(y) in indices and np.argmin(y) in indices
+
+
+def test_decimate_passthrough():
+    # Short, non-monotonic or non-finite data are returned unchanged
+    x, y = _noisy_signal(1000)
+    for xs, ys in [(x[:100], y[:100]), (x[::-1].copy() % 3, y),
+                   (x, np.where(x > 5, np.nan, y))]:
+        xd, yd = decimate.decimate(xs, ys, 200)
+        assert xd is xs or np.array_equal(xd, xs)
+        assert yd.size == ys.size
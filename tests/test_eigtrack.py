@@ -0,0 +1,58 @@
+# test_eigtrack.py - tests for eigenvalue branch tracking
+
+import numpy as np
+
+import eigtrack
+
+
+def test_real_crossings():
+    # Two real eigenvalues, crossing the imaginary axis in opposite
+    # directions at p = 1 and p = 2 (stable in between)
+    branches = eigtrack.track(lambda p: np.diag([1 - p, p - 2]), 0, 3)
+    params, indices, eigvals = zip(*branches.crossings)
+    np.testing.assert_allclose(params, [1, 2], atol=1e-12)
+    np.testing.assert_allclose(eigvals, 0, atol=1e-12)
+    assert indices[0] != indices[1]
+
+    # Each branch follows a single eigenvalue (the two branches meet at
+    # p = 1.5)
+    np.testing.assert_allclose(
+        branches.loci[:, indices[0]], 1 - branches.params, atol=1e-12)
+    p, stable = branches.params, branches.stable()
+    away = (np.abs(p - 1) > 1e-9) & (np.abs(p - 2) > 1e-9)
+    np.testing.assert_array_equal(stable[away], ((p > 1) & (p < 2))[away])
+
+
+def test_complex_crossing():
+    # A complex pair crosses the imaginary axis at p = 1, at +/- 2j (both
+    # branches are reported, at the same parameter value)
+    branches = eigtrack.track(
+        lambda p: np.array([[p - 1, 2], [-2, p - 1]]), 0, 2)
+    crossings = branches.crossings
+    assert len(crossings) == 2 and crossings[0][1] != crossings[1][1]
+    for p, _, eig in crossings:
+        np.testing.assert_allclose(p, 1, atol=1e-12)
+        np.testing.assert_allclose(abs(eig.imag), 2)
+    assert branches.params.tolist().count(crossings[0][0]) == 1
+
+    # Tracking backwards gives the same crossings
+    reverse = eigtrack.track(
+        lambda p: np.array([[p - 1, 2], [-2, p - 1]]), 2, 0)
+    np.testing.assert_allclose(
+        [p for p, _, _ in reverse.crossings], [1, 1], atol=1e-12)
+
+
+def test_bicycle_crossings():
+    # The bicycle model has a complex pair crossing at the weave speed and a
+    # real eigenvalue crossing at the capsize speed
+    import bicycle
+    branches = eigtrack.track(bicycle.whipple_A, 0, 15)
+    (v_weave, _, weave), (v_pair, _, _), (v_capsize, _, capsize) = \
+        branches.crossings
+    assert v_weave == v_pair and weave.imag != 0 and capsize.imag == 0
+
+    # The largest real part of the eigenvalues changes sign at the
+    # crossings
+    abscissa = lambda v: np.max(np.linalg.eigvals(bicycle.whipple_A(v)).real)
+    for v in [v_weave, v_capsize]:
+        assert abscissa(v - 1e-6) * abscissa(v + 1e-6) < 0
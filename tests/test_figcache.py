@@ -0,0 +1,42 @@
+# test_figcache.py - tests for the figure cache
+
+import figcache
+
+
+def test_cache_key_dependencies(tmp_path):
+    # The cache key changes when the script or a local module that it
+    # imports (directly, indirectly or inside a function) changes
+    files = {
+        'script.py': "import model\n\ndef main():\n    import helper\n",
+        'model.py': "import numpy as np\nimport shared\n",
+        'shared.py': "x = 1\n",
+        'helper.py': "y = 1\n",
+        'other.py': "z = 1\n",
+    }
+    for name, text in files.items():
+        (tmp_path / name).write_text(text)
+
+    key, deps = figcache.cache_key('script.py', str(tmp_path))
+    assert sorted(deps) == ['helper.py', 'model.py', 'script.py', 'shared.py']
+
+    for name in ['shared.py', 'helper.py', 'script.py']:
+        (tmp_path / name).write_text(files[name] + "# changed\n")
+        new_key, _ = figcache.cache_key('script.py', str(tmp_path))
+        assert new_key != key
+        key = new_key
+
+    # Files that are not imported do not affect the key
+    (tmp_path / 'other.py').write_text("z = 2\n")
+    assert figcache.cache_key('script.py', str(tmp_path))[0] == key
+
+
+def test_tooling_modules(tmp_path):
+    # Runner-side modules imported by a script are not part of its key
+    (tmp_path / 'script.py').write_text("import golden\nimport model\n")
+    (tmp_path / 'model.py').write_text("x = 1\n")
+    (tmp_path / 'golden.py').write_text("import model\n")
+
+    key, deps = figcache.cache_key('script.py', str(tmp_path))
+    assert sorted(deps) == ['model.py', 'script.py']
+    (tmp_path / 'golden.py').write_text("import model\n# changed\n")
+    assert figcache.cache_key('script.py', str(tmp_path))[0] == key
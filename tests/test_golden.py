@@ -0,0 +1,35 @@
+# test_golden.py - tests for the golden data store
+
+import numpy as np
+
+import golden
+
+
+def test_round_trip(tmp_path, monkeypatch):
+    # Arrays recorded in a golden file match when checked again, and
+    # changes beyond the tolerances are reported
+    filename = str(tmp_path / 'script.npz')
+    data = np.array([0., 1., np.nan, 3.])
+    monkeypatch.setattr(golden, '_registry', {
+        'data': (data, 1e-6, 0.), 'eigvals': (np.array([-1 + 2j]), 1e-8, 0.)})
+    golden.record(filename)
+    assert golden.check(filename) == []
+
+    golden._registry['data'] = (data * (1 + 1e-7), 1e-3, 0.)
+    assert golden.check(filename) == []         # recorded tolerances are used
+    golden._registry['data'] = (data * (1 + 1e-5), 1e-6, 0.)
+    errors = golden.check(filename)
+    assert len(errors) == 1 and errors[0].startswith('data:')
+
+    # Missing, extra and NaN mismatched arrays are reported
+    golden._registry['data'] = (np.array([0., 1., 2., 3.]), 1e-6, 0.)
+    golden._registry['extra'] = (np.zeros(2), 1e-6, 0.)
+    del golden._registry['eigvals']
+    errors = golden.check(filename)
+    assert sorted(error.split(':')[0] for error in errors) == \
+        ['data', 'eigvals', 'extra']
+
+    # Recording again increments the revision
+    golden.record(filename)
+    with np.load(filename) as stored:
+        assert '"revision": 1' in str(stored['__meta__'])